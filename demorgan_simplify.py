@@ -37,6 +37,9 @@ RE_DEMORGAN_CAND = re.compile(
     r'\s*(?P<comment>//.*)?\s*$'
 )
 
+# _split_top_level が追跡する必要のある文字だけを拾うトークナイザ
+RE_SPLIT_TOKENS = re.compile(r'[()&|]')
+
 
 def _split_top_level(body: str) -> Tuple[Optional[str], List[str]]:
     """
@@ -46,38 +49,35 @@ def _split_top_level(body: str) -> Tuple[Optional[str], List[str]]:
         "~a | ~b"           → ("|", ["~a", "~b"])
     もし & と | が混在していれば op=None, terms=[body] を返す。
     カッコのネストは depth で追跡し、depth==0 の演算子だけを分割対象にする。
+    1 文字ずつの Python ループではなく、`(`/`)`/`&`/`|` だけを正規表現で
+    拾って間の文字列をスライスするので、走査は興味のある文字数に比例する。
     """
     terms: List[str] = []
-    cur = []
     op: Optional[str] = None
     depth = 0
+    last = 0
 
-    for ch in body:
+    for m in RE_SPLIT_TOKENS.finditer(body):
+        ch = body[m.start()]
         if ch == '(':
             depth += 1
-            cur.append(ch)
         elif ch == ')':
             depth -= 1
-            cur.append(ch)
-        elif depth == 0 and ch in ('&', '|'):
+        elif depth == 0:
             # トップレベルの & or |
             if op is None:
                 op = ch
             elif op != ch:
                 # & と | が混在している
                 return None, [body]
-            terms.append(''.join(cur).strip())
-            cur = []
-        else:
-            cur.append(ch)
-
-    if cur:
-        terms.append(''.join(cur).strip())
+            terms.append(body[last:m.start()].strip())
+            last = m.end()
 
     if op is None:
         # 演算子なし (単項) → 変換対象外とみなす
         return None, [body]
 
+    terms.append(body[last:].strip())
     return op, terms
 
 
@@ -109,15 +109,21 @@ def _try_demorgan_simplify(body: str) -> Optional[str]:
     return f" {new_op} ".join(simplified_terms)
 
 
-def transform_lines(lines: List[str]) -> List[str]:
+def transform_lines_iter(lines):
     """
-    入力行リストに対して、ド・モルガンで簡略化可能な assign を変換する。
+    入力行イテレータに対して、ド・モルガンで簡略化可能な assign を変換しながら
+    1 行ずつ yield する。ファイル全体を持たずにストリーム処理できる。
     """
-    new_lines = []
     for line in lines:
+        # 正規表現より桁違いに安い部分文字列チェックで大半の行を素通しする
+        # （候補行は必ず 'assign' と '~(' を含む）
+        if 'assign' not in line or '~(' not in line:
+            yield line
+            continue
+
         m = RE_DEMORGAN_CAND.match(line)
         if not m:
-            new_lines.append(line)
+            yield line
             continue
 
         indent = m.group('indent') or ''
@@ -128,7 +134,7 @@ def transform_lines(lines: List[str]) -> List[str]:
         simplified = _try_demorgan_simplify(body)
         if simplified is None:
             # 変換できない → 元の行をそのまま残す
-            new_lines.append(line)
+            yield line
             continue
 
         # 簡略化成功
@@ -137,9 +143,15 @@ def transform_lines(lines: List[str]) -> List[str]:
             # keep two spaces before line comment (matches typical style)
             new_line += f"  {comment}"
         new_line += "\n"
-        new_lines.append(new_line)
+        yield new_line
 
-    return new_lines
+
+def transform_lines(lines: List[str]) -> List[str]:
+    """
+    入力行リストに対して、ド・モルガンで簡略化可能な assign を変換する。
+    （`transform_lines_iter` のリスト版）
+    """
+    return list(transform_lines_iter(lines))
 
 
 def main():
@@ -151,26 +163,25 @@ def main():
     import sys
     stdin_is_tty = sys.stdin.isatty()
 
-    # 入力決定
+    # 入力決定（ファイル全体を読み込まず、行単位でストリーム処理する）
     if args.input:
-        with open(args.input, encoding="utf-8") as f:
-            lines = f.readlines()
+        in_fh = open(args.input, encoding="utf-8")
     else:
         if not stdin_is_tty:
-            lines = sys.stdin.readlines()
+            in_fh = sys.stdin
         else:
             ap.print_usage()
             print("error: no input file, and no piped input", file=sys.stderr)
             sys.exit(1)
 
-    new_lines = transform_lines(lines)
-    out_str = "".join(new_lines)
-
-    if args.output:
-        with open(args.output, "w", encoding="utf-8") as f:
-            f.write(out_str)
-    else:
-        sys.stdout.write(out_str)
+    out_fh = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        out_fh.writelines(transform_lines_iter(in_fh))
+    finally:
+        if in_fh is not sys.stdin:
+            in_fh.close()
+        if out_fh is not sys.stdout:
+            out_fh.close()
 
 
 if __name__ == "__main__":
@@ -1,13 +1,56 @@
 #!/usr/bin/env python3
+import functools
+import os
 import re
 import sys
 import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Sequence, Set, Tuple, Union
 
 BEGIN = r'// @extract-begin'
 END   = r'// @extract-end'
+_RE_BEGIN = re.compile(BEGIN)
+_RE_END   = re.compile(END)
+
+# --------------------------------------------------
+# Precompiled patterns (hot paths run these per line / per instance)
+# --------------------------------------------------
+
+# ブロック/行コメントをまとめて1パスで除去する（`//[^\n]*` は改行を残す）
+_RE_ANY_COMMENT   = re.compile(r'/\*.*?\*/|//[^\n]*', re.S)
+_RE_IDENT_BASE    = re.compile(r'[A-Za-z_]\w*$')
+_RE_IDENT         = re.compile(r'[A-Za-z_]\w*')
+_RE_IDENT_OR_SLICE = re.compile(r'[A-Za-z_]\w*(?:\[[^\]]+\])?')
+_RE_PARENT_DECL = re.compile(
+    r'^\s*(wire|reg|logic)\b(?:\s+signed\b)?\s*(\[[^\]]+\])?\s*([^;]+);\s*$',
+    re.M
+)
+# 宣言名リスト "a, b[3], c = 1'b0" のカンマ区切り断片から base 名を拾う。
+# 識別子の直後が区切り（空白・添字・初期化子）か終端の場合だけ採用するので、
+# `x = {a, b}` のような初期化子の中で切れた断片 (`b}`) を名前と誤認しない
+_RE_DECL_NAME = re.compile(r'([A-Za-z_]\w*)(?=$|[\s\[=\{])')
+_RE_PORT_DECL = re.compile(
+    r'^\s*(input|output|inout)\b'     # 方向
+    r'(?:\s+\w+)*'                    # 型/キーワード（logic, wire, reg, signed など）
+    r'(?:\s*(\[[^\]]+\]))?'           # packed 幅（任意）
+    r'\s+([^;]+?)\s*;'                # ; までの識別子列
+    r'\s*$', re.M)
+_RE_MOD_HDR        = re.compile(r'module\s+[A-Za-z_]\w*\s*\((?P<plist>.*?)\)\s*;', re.S)
+_RE_MOD_HDR_SIMPLE = re.compile(r'module\s+[A-Za-z_]\w*\s*;')
+_RE_DIR_TOK        = re.compile(r'(input|output|inout)\b', re.I)
+_RE_INST_HEAD      = re.compile(r'^\s*([A-Za-z_]\w*)\s+[A-Za-z_]\w*\s*\(', re.M)
+_RE_DOT_PORT_HEAD  = re.compile(r'\.\s*([A-Za-z_]\w*)\s*\(')
+_RE_ASSIGN_LINE    = re.compile(r'^\s*assign\s+(.+?);\s*$', re.M)
+_RE_DECL_HEAD      = re.compile(r'^(wire|reg|logic)\b')
+# assign 文とインスタンスを 1 パスで拾う複合パターン。
+# assign 側は行内完結（[^\n]）、インスタンス本体のみ (?s:...) で複数行を許す。
+_RE_BLOCK_HEAD = re.compile(
+    r'^\s*assign\s+(?P<assign>[^\n]+?);\s*$'
+    r'|^\s*(?P<mod>[A-Za-z_]\w*)\s+[A-Za-z_]\w*\s*\(',
+    re.M)
 
 # --------------------------------------------------
 # Utility
@@ -16,30 +59,38 @@ END   = r'// @extract-end'
 
 def strip_comments(text: str) -> str:
     """Remove /* ... */ and // ... comments while preserving newlines."""
-    without_block = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
-    return re.sub(r'//.*', '', without_block)
+    return _RE_ANY_COMMENT.sub('', text)
+
+
+# 宣言エントリ "name[3:0] = 1'b0" などから base 名を切り出す際の区切り文字
+_BASE_DELIMS = ' \t\n\r[={'
+
+
+def _base_ident(tok: str) -> str:
+    """
+    Return the leading identifier of a declaration entry, dropping whitespace,
+    bit slices, initialisers and unpacked braces (`"b[3] = 1'b0"` -> `"b"`).
+    """
+    tok = tok.strip()
+    cut = len(tok)
+    for ch in _BASE_DELIMS:
+        i = tok.find(ch)
+        if 0 <= i < cut:
+            cut = i
+    return tok[:cut]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class PortInfo:
     direction: str
     width: str = ""
 
-    def __iter__(self):
-        """Allow tuple-unpacking semantics (direction, width)."""
-        yield self.direction
-        yield self.width
+    def as_tuple(self) -> Tuple[str, str]:
+        """Return the `(direction, width)` pair for tuple-style comparisons."""
+        return (self.direction, self.width)
 
-    def __eq__(self, other):
-        """Support comparisons against other PortInfo instances or (dir, width) tuples."""
-        if isinstance(other, PortInfo):
-            return (self.direction, self.width) == (other.direction, other.width)
-        if isinstance(other, tuple):
-            return (self.direction, self.width) == other
-        return NotImplemented
 
-
-@dataclass
+@dataclass(slots=True)
 class SignalRecord:
     is_input: bool = False
     is_output: bool = False
@@ -68,6 +119,13 @@ class SignalRecord:
         self.clear_input()
         self.update_width(width)
 
+def _normalize_search_dirs(search_dirs: Union[Sequence[Union[str, Path]], str, Path]) -> Tuple[str, ...]:
+    """Normalize the `-I` directory argument into a hashable tuple of strings."""
+    if isinstance(search_dirs, (str, Path)):
+        search_dirs = [search_dirs]
+    return tuple(str(d) for d in search_dirs)
+
+
 def read_module_src(mod_name: str, search_dirs: Union[Sequence[Union[str, Path]], str, Path]) -> str:
     """
     Locate `<mod_name>.sv|.v` under the provided directories and return its text.
@@ -75,27 +133,49 @@ def read_module_src(mod_name: str, search_dirs: Union[Sequence[Union[str, Path]]
     The search mimics `-I` behaviour: iterate the directories, pick the first
     existing match, and raise when multiple different files resolve to the same
     module name to avoid silently pulling in the wrong definition.
+
+    Results are memoized per `(mod_name, search_dirs)` so repeated extractions
+    of the same module skip the directory probing and file I/O.
     """
-    if isinstance(search_dirs, (str, Path)):
-        search_dirs = [search_dirs]
+    return _read_module_src_cached(mod_name, _normalize_search_dirs(search_dirs))
+
 
+@functools.lru_cache(maxsize=None)
+def _dir_index(d: str) -> "frozenset[str]":
+    """
+    Snapshot the entries of directory `d` once per process.
+
+    Probing `<mod>.sv` / `<mod>.v` with `Path.exists` costs one stat() per
+    candidate; with many modules that dominates. One `os.scandir` pass turns
+    every later lookup into a set probe. Missing directories yield an empty
+    set, matching the old "nothing found there" behaviour.
+    """
+    try:
+        with os.scandir(d) as it:
+            return frozenset(e.name for e in it)
+    except OSError:
+        return frozenset()
+
+
+@functools.lru_cache(maxsize=None)
+def _read_module_src_cached(mod_name: str, search_dirs: Tuple[str, ...]) -> str:
     found = []
     for d in search_dirs:
-        d = Path(d)
+        entries = _dir_index(d)
         for ext in ("sv", "v"):
-            p = d / f"{mod_name}.{ext}"
-            if p.exists():
-                found.append(p)
+            fname = f"{mod_name}.{ext}"
+            if fname in entries:
+                # open までは str のままで扱う（Path 生成は候補毎に地味に重い）
+                found.append(os.path.join(d, fname))
 
-    if len(found) == 0:
-        raise FileNotFoundError(f"Module file not found for '{mod_name}' in: {', '.join(map(str, search_dirs))}")
+    if not found:
+        raise FileNotFoundError(f"Module file not found for '{mod_name}' in: {', '.join(search_dirs)}")
     # 複数見つかったら衝突（意図しないファイルを拾わないようにする）
     if len(found) > 1:
-        # ただし、全く同じパスが重複しただけなら1つに圧縮
-        uniq = sorted(set(map(str, found)))
+        # ただし、全く同じパスが重複しただけなら1つとみなす
+        uniq = set(found)
         if len(uniq) > 1:
-            raise Exception(f"Multiple module files for '{mod_name}' found: {', '.join(uniq)}")
-        found = [Path(uniq[0])]
+            raise Exception(f"Multiple module files for '{mod_name}' found: {', '.join(sorted(uniq))}")
 
     with open(found[0], encoding="utf-8") as f:
         return f.read()
@@ -108,9 +188,11 @@ def split_with_markers(src: str):
     Raises:
         ValueError: if either marker is missing or they are nested improperly.
     """
-    m1 = re.search(BEGIN, src)
-    m2 = re.search(END, src)
-    if not m1 or not m2 or m1.end() > m2.start():
+    m1 = _RE_BEGIN.search(src)
+    # END は BEGIN より後ろにしか意味が無いので、プレフィックスを
+    # 走査し直さないよう開始位置を渡して探す
+    m2 = _RE_END.search(src, m1.end()) if m1 else None
+    if not m1 or not m2:
         raise ValueError("extract markers not found or malformed.")
     pre  = src[:m1.start()]
     block= src[m1.end():m2.start()]
@@ -127,37 +209,34 @@ def parse_parent_decls(src: str):
     widths when promoting signals to ports.
     """
     decls = {}
-    decl_re = re.compile(
-        r'^\s*(wire|reg|logic)\b(?:\s+signed\b)?\s*(\[[^\]]+\])?\s*([^;]+);\s*$',
-        re.M
-    )
-    for m in decl_re.finditer(src):
+    for m in _RE_PARENT_DECL.finditer(src):
         width = (m.group(2) or '').strip()
-        names = m.group(3)
-        for name in re.split(r'\s*,\s*', names):
-            base = re.split(r'\s|\[|=|\{', name.strip())[0]
-            if re.match(r'[A-Za-z_]\w*$', base):
-                decls[base] = width
+        for frag in m.group(3).split(','):
+            nm = _RE_DECL_NAME.match(frag.strip())
+            if nm:
+                decls[nm.group(1)] = width
     return decls
 
 # -- ヘルパ: "a, b[3], /*c*/ d" → ["a", "b", "d"]
-def _split_ident_list(idlist: str):
+def _split_ident_list(idlist: str, cleaned: bool = False):
     """
     Split a comma-separated identifier list (which may contain comments, bit
     slices, or initialisers) into clean base names.
 
     Example: `"a, b[3], /* c */ d = 1'b0"` -> `["a", "b", "d"]`.
+
+    Pass `cleaned=True` when `idlist` is already comment-free.
     """
-    s = strip_comments(idlist)
+    s = idlist if cleaned else strip_comments(idlist)
     names = []
-    for tok in re.split(r'\s*,\s*', s.strip()):
-        base = re.split(r'\s|\[|=|\{', tok.strip())[0]  # unpacked/初期化子/添字を落とす
-        if re.match(r'^[A-Za-z_]\w*$', base or ''):
+    for tok in s.split(','):
+        base = _base_ident(tok)  # unpacked/初期化子/添字を落とす
+        if _RE_IDENT_BASE.match(base):
             names.append(base)
     return names
 
 # -- ヘルパ: "input|output|inout ..." 形式の宣言ブロックから辞書を取る
-def _collect_ports_from_decl(text: str, prefer: str = 'first') -> Tuple[Dict[str, PortInfo], List[str]]:
+def _collect_ports_from_decl(text: str, prefer: str = 'first', cleaned: bool = False) -> Tuple[Dict[str, PortInfo], List[str]]:
     """
     Parse a block of `input|output|inout` statements and build
     `(port_dir, order)` collections.
@@ -166,19 +245,17 @@ def _collect_ports_from_decl(text: str, prefer: str = 'first') -> Tuple[Dict[str
         text: chunk of Verilog containing one or more port declarations.
         prefer: whether to keep the first occurrence (`'first'`) or allow later
             declarations to overwrite earlier ones.
+        cleaned: set True when `text` is already comment-free; otherwise the
+            comments are stripped here once instead of per declaration.
     """
     port_dir: Dict[str, PortInfo] = {}
     order: List[str] = []
-    decl_re = re.compile(
-        r'^\s*(input|output|inout)\b'     # 方向
-        r'(?:\s+\w+)*'                    # 型/キーワード（logic, wire, reg, signed など）
-        r'(?:\s*(\[[^\]]+\]))?'           # packed 幅（任意）
-        r'\s+([^;]+?)\s*;'                # ; までの識別子列
-        r'\s*$', re.M)
-    for m in decl_re.finditer(text):
+    if not cleaned:
+        text = strip_comments(text)
+    for m in _RE_PORT_DECL.finditer(text):
         d, width, idlist = m.groups()
         width = (width or '').strip()
-        for name in _split_ident_list(idlist):
+        for name in _split_ident_list(idlist, cleaned=True):
             info = PortInfo(direction=d, width=width)
             if name not in port_dir:
                 port_dir[name] = info
@@ -188,27 +265,44 @@ def _collect_ports_from_decl(text: str, prefer: str = 'first') -> Tuple[Dict[str
                 order.append(name)
     return port_dir, order
 
+def _find_word(text: str, word: str) -> int:
+    """
+    `str.find` ベースの `\\b word \\b` 検索。見つからなければ -1。
+    単純な固定語の境界チェックに正規表現を立ち上げないための補助。
+    """
+    i = text.find(word)
+    end = len(word)
+    while i != -1:
+        before = text[i - 1] if i > 0 else ''
+        after = text[i + end] if i + end < len(text) else ''
+        if (not before or not (before.isalnum() or before == '_')) and \
+           (not after or not (after.isalnum() or after == '_')):
+            return i
+        i = text.find(word, i + 1)
+    return -1
+
 # -- ヘッダの (...) 部分だけを抜き出してパース
-def _parse_ports_from_header(src: str) -> Tuple[Dict[str, PortInfo], List[str]]:
+def _parse_ports_from_header(src: str, mh=None) -> Tuple[Dict[str, PortInfo], List[str]]:
     """
     Extract ANSI-style port declarations from the `module (...) ;` header.
 
     The function segments the parameter list by direction keyword, appends a
     pseudo semicolon, and reuses `_collect_ports_from_decl` for the heavy
-    lifting.
+    lifting. `mh` accepts an already-computed `_RE_MOD_HDR` match so callers
+    that scanned the header once do not pay for a second scan.
     """
     header_port_dir: Dict[str, PortInfo] = {}
     header_order: List[str] = []
-    mod_hdr_re = re.compile(r'module\s+[A-Za-z_]\w*\s*\((?P<plist>.*?)\)\s*;', re.S)
-    mh = mod_hdr_re.search(src)
+    if mh is None:
+        mh = _RE_MOD_HDR.search(src)
     if not mh:
         return header_port_dir, header_order  # ヘッダ未検出（古い non-ANSI だけのケース）
-    plist = mh.group('plist')
+    # 疑似セミコロンを行コメントの後ろに付けてしまわないよう、先にコメントを除去
+    plist = strip_comments(mh.group('plist'))
 
     # 方向キーワード境界でセグメント化
     segs = []
-    tok_re = re.compile(r'(input|output|inout)\b', re.I)
-    positions = [m.start() for m in tok_re.finditer(plist)]
+    positions = [m.start() for m in _RE_DIR_TOK.finditer(plist)]
     if positions:
         positions.append(len(plist))
         for i in range(len(positions)-1):
@@ -217,38 +311,40 @@ def _parse_ports_from_header(src: str) -> Tuple[Dict[str, PortInfo], List[str]]:
     header_text = "\n".join(segs)
 
     if header_text.strip():
-        header_port_dir, header_order = _collect_ports_from_decl(header_text, prefer='first')
+        header_port_dir, header_order = _collect_ports_from_decl(header_text, prefer='first', cleaned=True)
     return header_port_dir, header_order
 
 # -- 本体部（endmodule まで）から non-ANSI 宣言をパース
-def _parse_ports_from_body(src: str) -> Tuple[Dict[str, PortInfo], List[str]]:
+def _parse_ports_from_body(src: str, hdr_end=None) -> Tuple[Dict[str, PortInfo], List[str]]:
     """
     Scan the module body (after the closing `);`) for non-ANSI
     `input|output|inout` declarations and return the same `(port_dir, order)`
-    tuple as the header parser.
+    tuple as the header parser. `hdr_end` accepts the `_RE_MOD_HDR` match
+    already found by the caller.
     """
     body_port_dir: Dict[str, PortInfo] = {}
     body_order: List[str] = []
     # まず最初の module のヘッダ終端を探す
-    hdr_end = re.search(r'module\s+[A-Za-z_]\w*\s*\(.*?\)\s*;', src, flags=re.S)
+    if hdr_end is None:
+        hdr_end = _RE_MOD_HDR.search(src)
     if hdr_end:
         body = src[hdr_end.end():]
     else:
         # ヘッダ無し（module m;）のケースは全体を body として扱う
-        m0 = re.search(r'module\s+[A-Za-z_]\w*\s*;', src)
+        m0 = _RE_MOD_HDR_SIMPLE.search(src)
         if m0:
             body = src[m0.end():]
         else:
             body = src
 
     # endmodule より先は切り落とす（最初の endmodule を想定）
-    em = re.search(r'\bendmodule\b', body)
-    if em:
-        body = body[:em.start()]
+    em = _find_word(body, 'endmodule')
+    if em != -1:
+        body = body[:em]
 
     body = strip_comments(body)
     if body.strip():
-        body_port_dir, body_order = _collect_ports_from_decl(body, prefer='first')
+        body_port_dir, body_order = _collect_ports_from_decl(body, prefer='first', cleaned=True)
     return body_port_dir, body_order
 
 def parse_module_ports(src: str) -> Tuple[Dict[str, PortInfo], List[str]]:
@@ -259,8 +355,10 @@ def parse_module_ports(src: str) -> Tuple[Dict[str, PortInfo], List[str]]:
     The header wins when both styles declare the same port so that modern code
     does not get overridden by legacy repetitions.
     """
-    header_dir, header_order = _parse_ports_from_header(src)
-    body_dir,   body_order   = _parse_ports_from_body(src)
+    # ヘッダの検索はここで一度だけ行い、両パーサに共有する
+    hdr_m = _RE_MOD_HDR.search(src)
+    header_dir, header_order = _parse_ports_from_header(src, hdr_m)
+    body_dir,   body_order   = _parse_ports_from_body(src, hdr_m)
 
     port_dir: Dict[str, PortInfo] = {}
     order: List[str] = []
@@ -282,7 +380,19 @@ def parse_module_ports(src: str) -> Tuple[Dict[str, PortInfo], List[str]]:
 
     return port_dir, order
 
-def find_instances(block_src: str):
+def parse_module_ports_for(mod_name: str, search_dirs) -> Tuple[Dict[str, PortInfo], List[str]]:
+    """
+    `read_module_src` + `parse_module_ports` を `(mod_name, search_dirs)` 単位で
+    メモ化したもの。同じモジュールを繰り返し参照してもパースは一度きり。
+    """
+    return _parse_module_ports_cached(mod_name, _normalize_search_dirs(search_dirs))
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_module_ports_cached(mod_name: str, search_dirs: Tuple[str, ...]) -> Tuple[Dict[str, PortInfo], List[str]]:
+    return parse_module_ports(_read_module_src_cached(mod_name, search_dirs))
+
+def find_instances(block_src: str, cleaned: bool = False):
     """
     Return the set of module names instantiated inside the extraction block.
 
@@ -291,14 +401,79 @@ def find_instances(block_src: str):
         bar u1 (...);
     yields `{"foo", "bar"}` which we later use to parse callee port
     definitions.
+
+    Pass `cleaned=True` when `block_src` has already been through
+    `strip_comments` to avoid re-stripping it.
     """
     mods = set()
-    cleaned = strip_comments(block_src)
-    for m in re.finditer(r'^\s*([A-Za-z_]\w*)\s+[A-Za-z_]\w*\s*\(', cleaned, flags=re.M):
+    cleaned_src = block_src if cleaned else strip_comments(block_src)
+    for m in _RE_INST_HEAD.finditer(cleaned_src):
         mods.add(m.group(1))
     return mods
 
-def parse_instance_conns(block_src: str, mod_name: str) -> Dict[str, Set[str]]:
+@functools.lru_cache(maxsize=None)
+def _inst_head_regex(mod_name: str) -> "re.Pattern[str]":
+    """Compiled `<mod_name> <inst> (` opener, cached per module name."""
+    return re.compile(rf'\b{re.escape(mod_name)}\s+[A-Za-z_]\w*\s*\(')
+
+def _inst_body_span(text: str, open_end: int):
+    """
+    Walk paren depth from just past an instance's opening paren to the
+    matching close, then require the terminating `;`.
+
+    Returns `(body_start, body_end, stmt_end)` indices into `text`, or None
+    when the statement is unterminated. Doing this by hand instead of a lazy
+    `(?s:.*?)\\)\\s*;` match keeps the scan linear even when connection
+    expressions nest parentheses.
+    """
+    depth = 1
+    i = open_end
+    n = len(text)
+    while i < n and depth:
+        c = text[i]
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        i += 1
+    if depth:
+        return None
+    j = i
+    while j < n and text[j].isspace():
+        j += 1
+    if j >= n or text[j] != ';':
+        return None
+    return open_end, i - 1, j + 1
+
+def _iter_dot_ports(body: str):
+    """
+    Yield `(port, expr)` pairs for every `.Port(expr)` inside an instance body.
+
+    The expression is delimited by walking paren depth rather than a lazy
+    `[^)]+?` regex, so nested calls/concatenations like `.P(f(a, b))` keep
+    their full text and the scanner never backtracks.
+    """
+    pos = 0
+    n = len(body)
+    while True:
+        m = _RE_DOT_PORT_HEAD.search(body, pos)
+        if not m:
+            return
+        depth = 1
+        i = m.end()
+        while i < n and depth:
+            c = body[i]
+            if c == '(':
+                depth += 1
+            elif c == ')':
+                depth -= 1
+            i += 1
+        if depth:
+            return  # 閉じカッコが無い → それ以降は諦める
+        yield m.group(1), body[m.end():i - 1].strip()
+        pos = i
+
+def parse_instance_conns(block_src: str, mod_name: str, cleaned: bool = False) -> Dict[str, Set[str]]:
     """
     Convert `.Port(expr)` connections for `mod_name` into a dictionary of
     `port -> {base_signal}`.
@@ -306,31 +481,34 @@ def parse_instance_conns(block_src: str, mod_name: str) -> Dict[str, Set[str]]:
     Only the base identifier matters (e.g. `.AAA(aaa[3:2])` -> `"aaa"`), so
     slices, concatenations, and simple expressions are tolerated as long as we
     can find identifier tokens inside them.
+
+    Pass `cleaned=True` when `block_src` is already comment-free.
     """
     out: Dict[str, Set[str]] = {}
-    inst_re = re.compile(
-        rf'{mod_name}\s+[A-Za-z_]\w*\s*\(\s*(?P<body>.*?)\s*\)\s*;',
-        re.S
-    )
-    search_space = strip_comments(block_src)
-    for im in inst_re.finditer(search_space):
-        body = strip_comments(im.group('body'))
+    head_re = _inst_head_regex(mod_name)
+    search_space = block_src if cleaned else strip_comments(block_src)
+    pos = 0
+    while True:
+        hm = head_re.search(search_space, pos)
+        if not hm:
+            break
+        span = _inst_body_span(search_space, hm.end())
+        if span is None:
+            pos = hm.end()
+            continue
+        body_start, body_end, pos = span
         # .Port(expr) を順に抽出
-        for p in re.finditer(r'\.\s*([A-Za-z_]\w*)\s*\(\s*([^)]+?)\s*\)', body):
-            port, expr = p.groups()
-            # コメントを除去
-            expr = strip_comments(expr)
-
+        for port, expr in _iter_dot_ports(search_space[body_start:body_end]):
             # 信号候補を抽出（識別子ベース部を取得）
             sigs = set()
-            for token in re.findall(r'[A-Za-z_]\w*(?:\[[^\]]+\])?', expr):
+            for token in _RE_IDENT_OR_SLICE.findall(expr):
                 base = token.split('[', 1)[0]  # ビットスライス削除
                 sigs.add(base)
             if sigs:
                 out.setdefault(port, set()).update(sigs)
     return out
 
-def collect_assign_rw(block_src: str) -> Tuple[Set[str], Set[str]]:
+def collect_assign_rw(block_src: str, cleaned: bool = False) -> Tuple[Set[str], Set[str]]:
     """
     Return `(lhs_set, rhs_set)` for every `assign` statement in the block.
 
@@ -338,13 +516,15 @@ def collect_assign_rw(block_src: str) -> Tuple[Set[str], Set[str]]:
         assign foo[3:0] = bar[3:0] & baz;
     yields `lhs_set={"foo"}` and `rhs_set={"bar", "baz"}` which later drive
     input/output inference.
+
+    Pass `cleaned=True` when `block_src` is already comment-free.
     """
     lhs_set: Set[str] = set()
     rhs_set: Set[str] = set()
-    text = strip_comments(block_src)
+    text = block_src if cleaned else strip_comments(block_src)
 
     # assign 行ごとに抽出（セミコロンで終わる）
-    for m in re.finditer(r'^\s*assign\s+(.+?);\s*$', text, flags=re.M):
+    for m in _RE_ASSIGN_LINE.finditer(text):
         stmt = m.group(1)
         # LHS = RHS に分割（最初の = で）
         if '=' not in stmt:
@@ -353,23 +533,73 @@ def collect_assign_rw(block_src: str) -> Tuple[Set[str], Set[str]]:
         ltok = lpart.strip()
         # LHS ベース名（スライス/添字除去）
         lhs_base = ltok.split('[', 1)[0].strip()
-        if re.match(r'[A-Za-z_]\w*$', lhs_base):
+        if _RE_IDENT_BASE.match(lhs_base):
             lhs_set.add(lhs_base)
 
         # RHS 識別子（スライス許容） → ベース名
-        for token in re.findall(r'[A-Za-z_]\w*(?:\[[^\]]+\])?', rpart):
+        for token in _RE_IDENT_OR_SLICE.findall(rpart):
             base = token.split('[', 1)[0]
             rhs_set.add(base)
 
     return lhs_set, rhs_set
 
-def extract_used_lines(outside_text: str) -> str:
+def scan_block(block_clean: str) -> Tuple[Set[str], Set[str], Dict[str, Dict[str, Set[str]]]]:
+    """
+    Walk the comment-free extract block once and collect everything the
+    classifier needs:
+
+        (assign_lhs_set, assign_rhs_set, {module: {port: {base_signal}}})
+
+    This fuses `collect_assign_rw`, `find_instances` and
+    `parse_instance_conns` into a single pass over the block.
+    """
+    lhs_set: Set[str] = set()
+    rhs_set: Set[str] = set()
+    conns_by_mod: Dict[str, Dict[str, Set[str]]] = {}
+
+    pos = 0
+    while True:
+        m = _RE_BLOCK_HEAD.search(block_clean, pos)
+        if not m:
+            break
+        stmt = m.group('assign')
+        if stmt is not None:
+            pos = m.end()
+            # LHS = RHS に分割（最初の = で）
+            if '=' not in stmt:
+                continue
+            lpart, rpart = stmt.split('=', 1)
+            lhs_base = lpart.strip().split('[', 1)[0].strip()
+            if _RE_IDENT_BASE.match(lhs_base):
+                lhs_set.add(lhs_base)
+            for token in _RE_IDENT_OR_SLICE.findall(rpart):
+                rhs_set.add(token.split('[', 1)[0])
+            continue
+
+        # インスタンス: 開きカッコ以降はカッコ深さの走査で本文を切り出す
+        span = _inst_body_span(block_clean, m.end())
+        if span is None:
+            pos = m.end()
+            continue
+        body_start, body_end, pos = span
+        conns = conns_by_mod.setdefault(m.group('mod'), {})
+        for port, expr in _iter_dot_ports(block_clean[body_start:body_end]):
+            sigs = {token.split('[', 1)[0]
+                    for token in _RE_IDENT_OR_SLICE.findall(expr)}
+            if sigs:
+                conns.setdefault(port, set()).update(sigs)
+
+    return lhs_set, rhs_set, conns_by_mod
+
+def extract_used_lines(outside_text: str) -> List[str]:
     """
-    Strip comments and declaration headers from the outside text so that
-    `token_used_outside` can perform a simple regex lookup.
+    Strip comments and declaration headers from the outside text, returning
+    the lines whose identifiers count as "uses".
 
     Declarations with initialisers keep only their RHS expressions because they
-    behave more like executable logic.
+    behave more like executable logic. The result stays a list of lines —
+    `used_token_set` tokenizes them directly, so there is no need to pay for
+    joining them back into one big string.
     """
     text = strip_comments(outside_text)
 
@@ -377,28 +607,50 @@ def extract_used_lines(outside_text: str) -> str:
     for line in text.splitlines():
         stripped = line.strip()
         if not stripped:
-            processed_lines.append('')
             continue
-        if re.match(r'^(wire|reg|logic)\b', stripped):
+        # 宣言行は必ず w/r/l で始まるので、1 文字比較で大半の行の
+        # 正規表現マッチを省く
+        if stripped[0] in 'wrl' and _RE_DECL_HEAD.match(stripped):
             if '=' in line:
                 _, rhs = line.split('=', 1)
                 processed_lines.append(rhs)
-            else:
-                processed_lines.append('')
             continue
         processed_lines.append(line)
-    return "\n".join(processed_lines)
+    return processed_lines
 
 
-def token_used_outside(name: str, used_lines: str) -> bool:
+def used_token_set(used_lines: Sequence[str], candidate_names=None) -> "frozenset[str]":
+    """
+    Tokenize the lines produced by `extract_used_lines` into the set of
+    identifiers they contain, so per-signal usage checks become O(1)
+    membership tests instead of full-text regex scans.
+
+    When `candidate_names` is given, a single alternation regex over just those
+    names is used instead, so only signals we may actually ask about are
+    collected — one C-level pass regardless of how large the outside text is.
+    """
+    if candidate_names is not None:
+        if not candidate_names:
+            return frozenset()
+        pattern = re.compile(
+            r'\b(?:' + '|'.join(re.escape(n) for n in sorted(candidate_names)) + r')\b'
+        )
+    else:
+        pattern = _RE_IDENT
+    tokens = set()
+    for line in used_lines:
+        tokens.update(pattern.findall(line))
+    return frozenset(tokens)
+
+
+def token_used_outside(name: str, used_tokens: "frozenset[str]") -> bool:
     """
     True if `name` shows up in the pre/post sections outside the extract block.
 
-    The helper assumes `used_lines` has already had comments and declaration
-    headers stripped via `extract_used_lines`, so a simple regex is sufficient
-    here.
+    `used_tokens` is the identifier set built by `used_token_set`, making the
+    lookup a hash probe rather than a regex scan over the outside text.
     """
-    return re.search(rf'\b{re.escape(name)}\b', used_lines) is not None
+    return name in used_tokens
 
 # --------------------------------------------------
 # Main extraction logic
@@ -430,25 +682,39 @@ def gen_extracted_module_from_dirs(whole_src: str, search_dirs, new_mod_name: st
         SystemVerilog source code for the extracted module.
     """
     pre, block, post = split_with_markers(whole_src)
-    outside = pre + post
     parent_decl = parse_parent_decls(whole_src)
-    used_lines = extract_used_lines(outside)
 
-    # assign からの読み書き抽出
-    lhs_assigned, rhs_used = collect_assign_rw(block)
-    assigned: Set[str] = set(lhs_assigned)
+    # コメント除去はブロックにつき一度だけ行い、以降は除去済みを使い回す
+    block_clean = strip_comments(block)
 
-    # ブロック内のモジュール一覧
-    mods = find_instances(block)
+    # 外部使用を問い合わせる信号はすべてブロック内の識別子なので、
+    # その集合だけを対象に外側テキストを 1 パスで走査する。
+    # pre と post は連結コピーを作らず、行リストとして合わせて処理する
+    candidate_names = set(_RE_IDENT.findall(block_clean))
+    used_tokens = used_token_set(
+        extract_used_lines(pre) + extract_used_lines(post), candidate_names)
 
-    # 信号毎の集計テーブル
-    sig_table: Dict[str, SignalRecord] = {}
+    # assign の読み書きとインスタンス接続をブロック 1 パスで収集
+    lhs_assigned, rhs_used, inst_conns = scan_block(block_clean)
+    assigned: Set[str] = set(lhs_assigned)
+
+    # 信号毎の集計テーブル（defaultdict なので参照時の SignalRecord() 仮生成が無い）
+    sig_table: Dict[str, SignalRecord] = defaultdict(SignalRecord)
 
     # ① モジュール入出力からの推論
-    for mod in mods:
-        mod_src = read_module_src(mod, search_dirs)
-        port_dir, order = parse_module_ports(mod_src)
-        conns = parse_instance_conns(block, mod)
+    # 参照モジュールのファイル読み込みは独立した I/O なので、複数あれば
+    # スレッドプールで先読みしてキャッシュを温める（以降の
+    # parse_module_ports_for は同じキャッシュから引くだけになる）
+    if len(inst_conns) > 1:
+        with ThreadPoolExecutor(max_workers=min(8, len(inst_conns))) as ex:
+            list(ex.map(lambda mod: read_module_src(mod, search_dirs), inst_conns))
+
+    # モジュール → ポート表 はここで 1 回だけ引いて共有テーブルにまとめる
+    module_table = {mod: parse_module_ports_for(mod, search_dirs)
+                    for mod in inst_conns}
+
+    for mod, conns in inst_conns.items():
+        port_dir, order = module_table[mod]
 
         for port_name in order:
             port_info = port_dir.get(port_name)
@@ -457,14 +723,14 @@ def gen_extracted_module_from_dirs(whole_src: str, search_dirs, new_mod_name: st
             for sig in conns.get(port_name, set()):
                 # 幅は 親宣言 > calleeポート
                 width = resolve_width(sig, parent_decl, port_info.width)
-                record = sig_table.setdefault(sig, SignalRecord())
+                record = sig_table[sig]
                 if port_info.direction == "input" and sig not in assigned:
                     record.mark_input(width)
                 elif port_info.direction == "output":
                     assigned.add(sig)
                     record.update_width(width)
                     record.clear_input()
-                    if token_used_outside(sig, used_lines):
+                    if token_used_outside(sig, used_tokens):
                         record.mark_output(width)
 
     # ② assign からの推論を統合
@@ -473,14 +739,14 @@ def gen_extracted_module_from_dirs(whole_src: str, search_dirs, new_mod_name: st
         if sig in assigned:
             continue
         width = resolve_width(sig, parent_decl, '')
-        record = sig_table.setdefault(sig, SignalRecord())
+        record = sig_table[sig]
         record.mark_input(width)
 
     # 出力: LHS に現れ、ブロック外で使用されているもののみ
     for sig in assigned:
-        if token_used_outside(sig, used_lines):
+        if token_used_outside(sig, used_tokens):
             width = resolve_width(sig, parent_decl, '')
-            record = sig_table.setdefault(sig, SignalRecord())
+            record = sig_table[sig]
             record.mark_output(width)
 
     # 最終 I/O 決定（output 優先で衝突解消）
@@ -508,18 +774,17 @@ def gen_extracted_module_from_dirs(whole_src: str, search_dirs, new_mod_name: st
         local_decl.append(f"logic{width_part} {name};")
 
     # 出力 SV 生成（ポートはヘッダに型付きで並べる）
-    decls = []
-    for n,w in inputs:
-        decls.append(f"input {w+' ' if w else ''}{n}")
-    for n,w in outputs:
-        decls.append(f"output {w+' ' if w else ''}{n}")
+    decls = [f"input {w} {n}" if w else f"input {n}" for n, w in inputs]
+    decls += [f"output {w} {n}" if w else f"output {n}" for n, w in outputs]
     header = f"module {new_mod_name}(\n    " + ",\n    ".join(decls) + "\n);\n"
 
-    body = block.strip("\n")
+    # 本文のコピーは strip 済みの 1 回だけ。末尾改行は別パーツとして
+    # join に任せ、`body + "\n"` の再コピーを作らない
     parts = [header]
     if local_decl:
         parts.append("    " + "\n    ".join(local_decl) + "\n")
-    parts.append(body + ("\n" if not body.endswith("\n") else ""))
+    parts.append(block.strip("\n"))
+    parts.append("\n")
     parts.append("endmodule\n")
     return "".join(parts)
 
@@ -527,8 +792,13 @@ def gen_extracted_module_from_dirs(whole_src: str, search_dirs, new_mod_name: st
 # CLI
 # --------------------------------------------------
 
-def main():
-    """CLI entrypoint: parse args, run the extractor, and emit the new module."""
+def main(argv=None):
+    """
+    CLI entrypoint: parse args, run the extractor, and emit the new module.
+
+    `argv` defaults to `sys.argv[1:]`; passing a list lets callers (tests)
+    run the tool in-process. Returns the process exit code.
+    """
     ap = argparse.ArgumentParser(
         description="Extract a marked block into a new module. "
                     "Search module definitions in given directories."
@@ -542,7 +812,7 @@ def main():
     ap.add_argument("--name", default="extracted_mod",
                     help="New module name (default: extracted_mod)")
 
-    args = ap.parse_args()
+    args = ap.parse_args(argv)
 
     top_path = Path(args.top)
     if not top_path.exists():
@@ -558,7 +828,7 @@ def main():
         out_text = gen_extracted_module_from_dirs(top_src, search_dirs, new_mod_name=args.name)
     except Exception as e:
         print(f"[ERROR] {e}", file=sys.stderr)
-        sys.exit(1)
+        return 1
 
     if args.output == "-" or args.output == "":
         sys.stdout.write(out_text)
@@ -567,6 +837,7 @@ def main():
         out_path.parent.mkdir(parents=True, exist_ok=True)
         with open(out_path, "w", encoding="utf-8") as f:
             f.write(out_text)
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+import functools
+import os
 import re
 import sys
 import argparse
@@ -8,51 +10,96 @@ from pathlib import Path
 DEFAULT_BEGIN = r'// @inline-begin'
 DEFAULT_END   = r'// @inline-end'
 
+# ===== extract_module_body の行分類・宣言名抽出パターン =====
+# 呼び出しの度に再コンパイルしないようモジュールレベルに置く。
+# ポート宣言と内部宣言の判定は選択肢 1 本にまとめ、行あたり 1 マッチで分類する。
+_LINE_HEAD_RE  = re.compile(r'^\s*(?:(?P<port>input|output)|(?P<decl>wire|reg|logic))\b')
+_STRIP_HEAD_RE = re.compile(r'^\s*(wire|reg|logic)\b.*?\s')
+_STRIP_IDX_RE  = re.compile(r'\[[^\]]+\]')
+_STRIP_INIT_RE = re.compile(r'=[^,]+')
+_NAME_TOKEN_RE = re.compile(r'[A-Za-z_]\w*')
+
 # ===== 共有ユーティリティ（extract.py と揃える） =====
 
-def read_module_src(mod_name, search_dirs):
-    """search_dirs 内から mod_name.(sv|v) を探索して読み込む。曖昧ならエラー。"""
+def _normalize_search_dirs(search_dirs):
+    """`-I` 引数をハッシュ可能な文字列タプルに正規化する。"""
     if isinstance(search_dirs, (str, Path)):
         search_dirs = [search_dirs]
+    return tuple(str(d) for d in search_dirs)
+
+def read_module_src(mod_name, search_dirs):
+    """search_dirs 内から mod_name.(sv|v) を探索して読み込む。曖昧ならエラー。
+    同じ (mod_name, search_dirs) の再読み込みはキャッシュで省く。"""
+    return _read_module_src_cached(mod_name, _normalize_search_dirs(search_dirs))
+
+@functools.lru_cache(maxsize=None)
+def _dir_index(d):
+    """ディレクトリの中身を 1 回だけ列挙して、以後の存在確認を集合参照にする。"""
+    try:
+        with os.scandir(d) as it:
+            return frozenset(e.name for e in it)
+    except OSError:
+        return frozenset()
+
+@functools.lru_cache(maxsize=None)
+def _read_module_src_cached(mod_name, search_dirs):
     found = []
     for d in search_dirs:
-        d = Path(d)
+        entries = _dir_index(d)
         for ext in ("sv", "v"):
-            p = d / f"{mod_name}.{ext}"
-            if p.exists():
-                found.append(p)
-    if len(found) == 0:
-        raise FileNotFoundError(f"Module file not found for '{mod_name}' in: {', '.join(map(str, search_dirs))}")
-    uniq = sorted(set(map(str, found)))
-    if len(uniq) > 1:
-        raise Exception(f"Multiple module files for '{mod_name}' found: {', '.join(uniq)}")
-    with open(uniq[0], encoding="utf-8") as f:
+            fname = f"{mod_name}.{ext}"
+            if fname in entries:
+                # open までは str のままで扱う（Path 生成は候補毎に地味に重い）
+                found.append(os.path.join(d, fname))
+    if not found:
+        raise FileNotFoundError(f"Module file not found for '{mod_name}' in: {', '.join(search_dirs)}")
+    # 一意なら dedup の set/sort を省く（通常ケースの高速パス）
+    if len(found) > 1:
+        uniq = set(found)
+        if len(uniq) > 1:
+            raise Exception(f"Multiple module files for '{mod_name}' found: {', '.join(sorted(uniq))}")
+    with open(found[0], encoding="utf-8") as f:
         return f.read()
 
+@functools.lru_cache(maxsize=None)
+def _marker_regex(pat: str) -> "re.Pattern[str]":
+    """マーカーパターンのコンパイル結果をパターン文字列ごとにキャッシュする。
+    extract.py と違いマーカーは引数で渡ってくるので、モジュール定数の
+    事前コンパイルの代わりにここでキャッシュする。"""
+    return re.compile(pat)
+
 def split_with_markers(src: str, begin_pat: str, end_pat: str):
-    m1 = re.search(begin_pat, src)
-    m2 = re.search(end_pat, src)
-    if not m1 or not m2 or m1.end() > m2.start():
+    m1 = _marker_regex(begin_pat).search(src)
+    # END は BEGIN より後ろにしか意味が無いので、プレフィックスを
+    # 走査し直さないよう開始位置を渡して探す
+    m2 = _marker_regex(end_pat).search(src, m1.end()) if m1 else None
+    if not m1 or not m2:
         raise ValueError("inline markers not found or malformed.")
     pre  = src[:m1.start()]
     block= src[m1.end():m2.start()]
     post = src[m2.end():]
     return pre, block, post
 
+_PARENT_DECL_RE = re.compile(
+    r'^\s*(wire|reg|logic)\b(?:\s+signed\b)?\s*(\[[^\]]+\])?\s+([^;]+);\s*$',
+    re.M
+)
+# 宣言名リスト "a, b[3], c = 1'b0" のカンマ区切り断片から base 名を拾う。
+# 識別子の直後が区切りか終端の場合だけ採用し、`= {a, b}` のような初期化子の
+# 中で切れた断片を名前と誤認しない
+_DECL_NAME_RE = re.compile(r'([A-Za-z_]\w*)(?=$|[\s\[=\{])')
+
+@functools.lru_cache(maxsize=None)
 def parse_parent_decls(src: str):
-    """統合先ファイル中の logic|wire|reg 宣言名 → 幅 の辞書を取る（衝突判定にも利用）"""
+    """統合先ファイル中の logic|wire|reg 宣言名 → 幅 の辞書を取る（衝突判定にも利用）。
+    同じテキストを繰り返し解析しないよう src ごとにキャッシュする（戻り値は共有されるので変更しないこと）。"""
     decls = {}
-    decl_re = re.compile(
-        r'^\s*(wire|reg|logic)\b(?:\s+signed\b)?\s*(\[[^\]]+\])?\s+([^;]+);\s*$',
-        re.M
-    )
-    for m in decl_re.finditer(src):
+    for m in _PARENT_DECL_RE.finditer(src):
         width = (m.group(2) or '').strip()
-        names = m.group(3)
-        for name in re.split(r'\s*,\s*', names):
-            base = re.split(r'\s|\[|=|\{', name.strip())[0]
-            if re.match(r'[A-Za-z_]\w*$', base):
-                decls[base] = width
+        for frag in m.group(3).split(','):
+            nm = _DECL_NAME_RE.match(frag.strip())
+            if nm:
+                decls[nm.group(1)] = width
     return decls
 
 def parse_module_ports(src: str):
@@ -65,6 +112,35 @@ def parse_module_ports(src: str):
         order.append(n)
     return port_dir, order
 
+_ANY_COMMENT_RE = re.compile(r'/\*.*?\*/|//[^\n]*', re.S)
+_DOT_PORT_HEAD_RE = re.compile(r'\.\s*([A-Za-z_]\w*)\s*\(')
+
+def _iter_dot_ports(body: str):
+    """
+    インスタンス本文から .Port(expr) を順に (port, expr) で yield する。
+    expr の終端は `[^)]+?` ではなくカッコ深さの走査で決めるので、
+    `.P(f(a, b))` のようなネストも正しく切り出せる。
+    """
+    pos = 0
+    n = len(body)
+    while True:
+        m = _DOT_PORT_HEAD_RE.search(body, pos)
+        if not m:
+            return
+        depth = 1
+        i = m.end()
+        while i < n and depth:
+            c = body[i]
+            if c == '(':
+                depth += 1
+            elif c == ')':
+                depth -= 1
+            i += 1
+        if depth:
+            return  # 閉じカッコが無い → それ以降は諦める
+        yield m.group(1), body[m.end():i - 1].strip()
+        pos = i
+
 def parse_instance_conns_expr(block_src: str, mod_name: str):
     """
     マーカー内から mod_name のインスタンスを探し、.Port(expr) を {Port: expr} で返す。
@@ -77,20 +153,21 @@ def parse_instance_conns_expr(block_src: str, mod_name: str):
     m = inst_re.search(block_src)
     if not m:
         return None, None
-    body = m.group('body')
+    # コメントは expr 毎ではなく本文から 1 回で除去する
+    body = _ANY_COMMENT_RE.sub('', m.group('body'))
     conns = {}
-    for p in re.finditer(r'\.\s*([A-Za-z_]\w*)\s*\(\s*([^)]+?)\s*\)', body):
-        port, expr = p.groups()
-        # コメント除去
-        expr = re.sub(r'/\*.*?\*/', '', expr, flags=re.S)
-        expr = re.sub(r'//.*', '', expr)
+    for port, expr in _iter_dot_ports(body):
         conns[port] = expr.strip()
     return conns, m.span()  # 接続辞書と、インスタンスの本文 span（置換に使う場合に備え返す）
 
+@functools.lru_cache(maxsize=None)
 def extract_module_body(src: str, mod_name: str):
     """
     module mod_name (...) ... endmodule から、本体（ポート宣言を除く）を抽出。
     戻り値: (body_text, port_dir, port_order, internal_declared_names)
+
+    バッチ処理では同じモジュールを何度もインライン化するので、
+    (src, mod_name) ごとに解析結果をキャッシュする（戻り値は共有されるので変更しないこと）。
     """
     # module 本体全体
     mod_re = re.compile(
@@ -111,27 +188,24 @@ def extract_module_body(src: str, mod_name: str):
     # 内部宣言名（衝突検出用）
     internal_names = set()
 
-    decl_line_re = re.compile(r'^\s*(wire|reg|logic)\b.*?;\s*$')
-    # 識別子列抽出（宣言行の右半分から名前だけ拾う）
-    name_token_re = re.compile(r'[A-Za-z_]\w*')
-
     for ln in lines:
-        if re.match(r'^\s*(input|output)\b', ln):  # ポート宣言は削除
+        head = _LINE_HEAD_RE.match(ln)
+        if head and head.group('port'):  # ポート宣言は削除
             continue
         body_lines.append(ln)
 
         # 内部宣言の収集（wire/logic/reg）
-        if decl_line_re.match(ln):
+        if head and head.group('decl') and ln.rstrip().endswith(';'):
             # 先頭の型などを削る
             # 例: logic signed [3:0] a, b, c;
             rhs = ln.split(';', 1)[0]
             # カッコ内・幅などをざっくり除去してから名前を拾う
             # （厳密にするなら AST を推奨）
-            rhs = re.sub(r'^\s*(wire|reg|logic)\b.*?\s', ' ', rhs)
+            rhs = _STRIP_HEAD_RE.sub(' ', rhs)
             # 配列添字や初期化子を粗く殺す
-            rhs = re.sub(r'\[[^\]]+\]', ' ', rhs)
-            rhs = re.sub(r'=[^,]+', ' ', rhs)
-            for tok in name_token_re.findall(rhs):
+            rhs = _STRIP_IDX_RE.sub(' ', rhs)
+            rhs = _STRIP_INIT_RE.sub(' ', rhs)
+            for tok in _NAME_TOKEN_RE.findall(rhs):
                 if tok and tok not in port_names:
                     internal_names.add(tok)
 
@@ -143,12 +217,14 @@ def replace_ports_with_expr(body_text: str, port_to_expr: dict):
     本体テキスト中のポート識別子を (expr) で置換（単語境界一致）。
     コメントも置換対象に含まれる（簡易実装）。必要なら強化可能。
     """
-    out = body_text
-    # 長い識別子から置換すると誤置換を減らせる
-    for port in sorted(port_to_expr.keys(), key=len, reverse=True):
-        expr = port_to_expr[port]
-        out = re.sub(rf'\b{re.escape(port)}\b', f'({expr})', out)
-    return out
+    if not port_to_expr:
+        return body_text
+    # ポート毎に全文を re.sub し直すと O(本文長 × ポート数) になるので、
+    # 全ポートをまとめた選択肢 1 本で 1 パス置換する
+    # （長い識別子を先に並べると誤置換を減らせる）
+    alt = '|'.join(re.escape(p) for p in sorted(port_to_expr.keys(), key=len, reverse=True))
+    pattern = re.compile(rf'\b({alt})\b')
+    return pattern.sub(lambda m: f'({port_to_expr[m.group(1)]})', body_text)
 
 # ===== インライン実装 =====
 
@@ -188,7 +264,8 @@ def inline_module(whole_src: str, mod_name: str, search_dirs, begin_pat: str, en
 
 # ===== CLI =====
 
-def main():
+def main(argv=None):
+    """CLI 本体。argv を渡せばテストからインプロセスで実行できる。終了コードを返す。"""
     ap = argparse.ArgumentParser(
         description="Inline a module instance: copy the module body into the marked region, "
                     "replace ports with instance expressions, and abort if local names collide."
@@ -203,7 +280,7 @@ def main():
     ap.add_argument("--end", default=DEFAULT_END,
                     help=f"End marker regex (default: {DEFAULT_END!r})")
 
-    args = ap.parse_args()
+    args = ap.parse_args(argv)
     top_path = Path(args.top)
     if not top_path.exists():
         ap.error(f"Top file not found: {top_path}")
@@ -216,7 +293,7 @@ def main():
     new_src = inline_module(top_src, args.module, search_dirs, args.begin, args.end)
     if new_src is None:
         # 衝突あり：仕様により「標準出力に衝突名を出した上で失敗終了」
-        sys.exit(2)
+        return 2
 
     if args.output == "-" or args.output == "":
         sys.stdout.write(new_src)
@@ -224,6 +301,7 @@ def main():
         out_path = Path(args.output)
         out_path.parent.mkdir(parents=True, exist_ok=True)
         out_path.write_text(new_src, encoding="utf-8")
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
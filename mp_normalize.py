@@ -23,6 +23,7 @@
 """
 
 import argparse
+import functools
 import re
 from typing import Dict, List, Tuple, Set, Optional
 
@@ -43,6 +44,13 @@ RE_ASSIGN_P_FROM_M = re.compile(
 # p_hoge の存在判定用（ビット指定がついていてもマッチする）
 RE_P_NAME = re.compile(r'\b(p_[A-Za-z_]\w*)\b')
 
+# 宣言行の 1 エントリ（名前 + optional 初期値）
+# 例: "m_hoge", "m_hoge[3:0]", "m_hoge = 1'b0"
+RE_DECL_ENTRY = re.compile(
+    r'(?P<name>(?:m_|p_)?[A-Za-z_]\w*(?:\[[^\]]+\])?)'
+    r'\s*(?P<init>=\s*.+)?$'
+)
+
 # 宣言行 (wire/reg/logic/tri/bit) をざっくり検出
 RE_DECL = re.compile(
     r'^(?P<indent>\s*)'
@@ -52,25 +60,106 @@ RE_DECL = re.compile(
 )
 
 
+def _trie_alternation(words: List[str]) -> str:
+    """
+    単語集合をトライ状に共通接頭辞でまとめた選択肢パターンを組み立てる。
+
+    素朴な "a|ab|ac|..." は選択肢ごとにバックトラックで先頭から照合し直す
+    のに対し、"a(?:b|c)?" の形なら共通部分を 1 回しか照合しない
+    （Aho–Corasick の stdlib 正規表現版）。greedy な ?/選択肢の性質上、
+    最長の単語が優先されるのは長さ降順の alternation と同じ。
+    """
+    trie: Dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[''] = None  # 終端マーカー
+
+    def emit(node: Dict) -> str:
+        alts = []
+        has_end = False
+        for ch, child in sorted(node.items()):
+            if ch == '':
+                has_end = True
+                continue
+            alts.append(re.escape(ch) + emit(child))
+        if not alts:
+            return ''
+        body = alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+        if has_end:
+            return '(?:' + '|'.join(alts) + ')?'
+        return body
+
+    return emit(trie)
+
+
+@functools.lru_cache(maxsize=None)
+def _elim_pattern(bases: Tuple[str, ...]):
+    """
+    消去対象 base（ソート済みタプル）から置換用パターンを 1 本だけ作る。
+    「~( m_hoge[...] )」「~m_hoge[...]」「m_hoge[...]」の 3 形式を選択肢で
+    まとめ、どのグループにマッチしたかでコールバック側が書き分ける。
+    全文 1 回の sub で済み、transform を複数回呼ぶバッチ処理では
+    キャッシュで再コンパイルも省ける。空白は改行を除く [^\\S\\n] に
+    限定してあるので、全文適用でも行をまたいだマッチは起きない。
+    """
+    bases_alt = _trie_alternation(sorted(bases))
+    idx = r'\[[^\]]+\]'
+    ws = r'[^\S\n]*'
+    return re.compile(
+        rf'~{ws}\({ws}m_(?P<nb>{bases_alt})(?P<ni>{idx})?{ws}\)'  # ~( m_hoge[...] )
+        rf'|~{ws}m_(?P<db>{bases_alt})\b(?P<di>{idx})?'           # ~m_hoge[...]
+        rf'|\bm_(?P<pb>{bases_alt})\b(?P<pi>{idx})?'              # m_hoge[...]
+    )
+
+
+def _elim_repl(match: re.Match) -> str:
+    """`_elim_pattern` のマッチを書き換える共通コールバック。"""
+    base = match.group('nb')
+    if base is not None:
+        return f"p_{base}{match.group('ni') or ''}"
+    base = match.group('db')
+    if base is not None:
+        return f"p_{base}{match.group('di') or ''}"
+    return f"~p_{match.group('pb')}{match.group('pi') or ''}"
+
+
 def strip_outer_parens(expr: str) -> str:
     """Remove redundant surrounding parentheses from an expression."""
     expr = expr.strip()
-    while expr.startswith("(") and expr.endswith(")"):
-        depth = 0
-        balanced = True
-        for i, ch in enumerate(expr):
-            if ch == "(":
-                depth += 1
-            elif ch == ")":
-                depth -= 1
-            if depth == 0:
-                if i != len(expr) - 1:
-                    balanced = False
-                break
-        if not balanced or depth != 0:
-            break
-        expr = expr[1:-1].strip()
-    return expr
+    if not expr.startswith('('):
+        return expr
+    # 剥がす層ごとに全体を走査し直すと O(n×深さ) になるので、
+    # まず 1 パスで各 '(' に対応する ')' の位置を求め、
+    # あとは添字の付け合わせだけで外側カッコを何層剥がせるか決める
+    match_at: Dict[int, int] = {}
+    stack: List[int] = []
+    for i, ch in enumerate(expr):
+        if ch == '(':
+            stack.append(i)
+        elif ch == ')':
+            if not stack:
+                return expr  # 対応の取れない ')' → 触らない
+            match_at[stack.pop()] = i
+    if stack:
+        return expr  # 閉じられていない '(' → 触らない
+    l, r = 0, len(expr) - 1
+    while l < r and expr[l] == '(' and match_at.get(l) == r:
+        l += 1
+        r -= 1
+        while l < r and expr[l].isspace():
+            l += 1
+        while r > l and expr[r].isspace():
+            r -= 1
+    return expr[l:r + 1]
+
+
+# "= ~(" の頭出し（間の空白は任意）
+RE_EQ_NEG_PAREN = re.compile(r'=\s*~\s*\(')
+
+# 宣言の名前リストをカンマで割る（前後の空白ごと C 側で落とす）
+RE_COMMA_SPLIT = re.compile(r'\s*,\s*')
 
 
 def _extract_negated_rhs(line: str) -> Optional[str]:
@@ -78,35 +167,37 @@ def _extract_negated_rhs(line: str) -> Optional[str]:
     line に含まれる RHS が ~( ... ) だけで構成されている場合に
     カッコの中身を返す。そうでなければ None。
     """
-    code = line.split('//', 1)[0]
-    if '=' not in code or ';' not in code:
+    # 対象行は必ず '~' を含むので、split やインデックス探索より先に
+    # C レベルの部分文字列検索 1 回で振り落とす
+    if '~' not in line:
         return None
 
+    comment_idx = line.find('//')
+    code = line if comment_idx == -1 else line[:comment_idx]
+
     eq_idx = code.find('=')
+    if eq_idx == -1:
+        return None
     semi_idx = code.rfind(';')
-    if semi_idx == -1 or semi_idx <= eq_idx:
+    if semi_idx <= eq_idx:
         return None
 
-    rhs = code[eq_idx + 1:semi_idx].strip()
-    if not rhs.startswith('~'):
-        return None
-    rhs = rhs[1:].lstrip()
-    if not rhs.startswith('('):
+    m = RE_EQ_NEG_PAREN.match(code, eq_idx)
+    if not m:
         return None
 
-    rhs = rhs[1:]
+    start = m.end()
     depth = 1
-    for idx, ch in enumerate(rhs):
+    for j in range(start, semi_idx):
+        ch = code[j]
         if ch == '(':
             depth += 1
         elif ch == ')':
             depth -= 1
             if depth == 0:
-                inner = rhs[:idx].strip()
-                rest = rhs[idx + 1:].strip()
-                if rest:
+                if code[j + 1:semi_idx].strip():
                     return None
-                return inner
+                return code[start:j].strip()
     return None
 
 
@@ -120,6 +211,11 @@ def collect_info(lines: List[str]):
     existing_p_bases: Set[str] = set()
 
     for idx, line in enumerate(lines):
+        # 候補行は必ず m_ か p_ を含むので、正規表現 3 本を回す前に
+        # C レベルの部分文字列検索で大半の行を振り落とす
+        if 'm_' not in line and 'p_' not in line:
+            continue
+
         m = RE_ASSIGN_M.match(line)
         if m:
             base = m.group('base')
@@ -173,17 +269,11 @@ def rewrite_declarations(lines: List[str],
             names_part = names_part[closing + 1:].lstrip()
 
         # "m_hoge, foo, m_bar[3:0]" みたいなのをカンマで割る
-        entries = [e.strip() for e in names_part.split(',') if e.strip()]
+        entries = [e for e in RE_COMMA_SPLIT.split(names_part) if e]
         new_entries: List[str] = []
 
         for entry in entries:
-            # 各エントリ (名前 +  optional init) をパース
-            # 例: "m_hoge", "m_hoge[3:0]", "m_hoge = 1'b0"
-            em = re.match(
-                r'(?P<name>(?:m_|p_)?[A-Za-z_]\w*(?:\[[^\]]+\])?)'
-                r'\s*(?P<init>=\s*.+)?$',
-                entry
-            )
+            em = RE_DECL_ENTRY.match(entry)
             if not em:
                 # よくわからない形はそのまま残す
                 new_entries.append(entry)
@@ -304,38 +394,19 @@ def transform(lines: List[str]) -> List[str]:
 
     # --- m_hoge[...] 参照を ~p_hoge[...] に置換 ---
     # 対象 base: rename_bases（case1） + pair_bases（case2）
+    # base 毎に行全体を走査し直すと O(行数 × base数) になるので、
+    # 全 base をまとめた選択肢 1 本の正規表現で行あたり 1 パスに抑える
     elim_bases = rename_bases | pair_bases
 
-    for base in elim_bases:
-        # m_hoge[...]
-        base_pattern = rf'm_{re.escape(base)}'
-        idx_pattern = r'(\[[^\]]+\])?'
-
-        pattern_neg_paren = re.compile(
-            rf'~\s*\(\s*({base_pattern}){idx_pattern}\s*\)'
-        )
-        pattern_neg_direct = re.compile(
-            rf'~\s*({base_pattern})\b{idx_pattern}'
-        )
-        pattern_plain = re.compile(
-            rf'\b({base_pattern})\b{idx_pattern}'
-        )
-
-        def repl_negated(match: re.Match) -> str:
-            idx_part = match.group(2) or ''
-            return f"p_{base}{idx_part}"
-
-        def repl_plain(match: re.Match) -> str:
-            idx_part = match.group(2) or ''
-            return f"~p_{base}{idx_part}"
-
-        for i, line in enumerate(new_lines):
-            if not line:
-                continue
-            updated = pattern_neg_paren.sub(repl_negated, line)
-            updated = pattern_neg_direct.sub(repl_negated, updated)
-            updated = pattern_plain.sub(repl_plain, updated)
-            new_lines[i] = updated
+    if elim_bases:
+        # 行ごとに sub を呼ぶと sre のセットアップとコールバック境界を
+        # 行数ぶん払うので、全文に対する 1 回の sub にまとめる
+        text = ''.join(new_lines)
+        # どのパターンも必ず "m_" を含むので、正規表現を走らせる前に
+        # C レベルの部分文字列検索 1 回で置換対象の有無を判定できる
+        if 'm_' in text:
+            pattern = _elim_pattern(tuple(sorted(elim_bases)))
+            new_lines = pattern.sub(_elim_repl, text).splitlines(keepends=True)
 
     return new_lines
 
@@ -346,22 +417,24 @@ def main():
     ap.add_argument("-o", "--output", help="出力ファイル（省略時は stdout）")
     args = ap.parse_args()
 
+    # transform は行番号でランダムアクセスするのでリストは必要だが、
+    # readlines() の中間バッファを挟まずイテレータから直接確保する
     if args.input == '-' or args.input is None:
         import sys
-        lines = sys.stdin.readlines()
+        lines = list(sys.stdin)
     else:
         with open(args.input, encoding="utf-8") as f:
-            lines = f.readlines()
+            lines = list(f)
 
     new_lines = transform(lines)
 
-    out_str = "".join(new_lines)
+    # 全行を 1 本の文字列に連結し直さず、行リストのまま書き出す
     if args.output:
         with open(args.output, "w", encoding="utf-8") as f:
-            f.write(out_str)
+            f.writelines(new_lines)
     else:
         import sys
-        sys.stdout.write(out_str)
+        sys.stdout.writelines(new_lines)
 
 
 if __name__ == "__main__":
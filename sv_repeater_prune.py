@@ -4,11 +4,17 @@
 import argparse
 import difflib
 import re
-from collections import defaultdict
-from typing import Dict, List, Optional, Tuple
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
 
 BitIndex = Optional[int]
-BitMap = Dict[str, Dict[BitIndex, Tuple[str, bool]]]
+# ビット参照は "foo[3]" のような文字列ではなく、パース済みの (name, idx) で持つ。
+# マップを辿るたびに文字列を組み立て直して再パースするコストと、
+# ワイドバス展開時のビット数ぶんの文字列アロケーションを丸ごと省ける。
+BitRef = Tuple[str, BitIndex]
+# base → idx → 値 の二段 dict ではなく (base, idx) キーのフラットな 1 段 dict。
+# 解決の 1 ホップごとに払うハッシュ探索が 2 回から 1 回になる
+BitMap = Dict[BitRef, Tuple[BitRef, bool]]
 
 ASSIGN_RE = re.compile(
     r'^\s*assign\s+(?P<lhs>[^=]+?)\s*=\s*(?P<rhs>.+?)\s*;\s*(?P<comment>//.*)?$',
@@ -38,9 +44,24 @@ REPL_RE = re.compile(
 
 INV_TOKEN_RE = re.compile(r'^\s*~\s*(?P<what>.+?)\s*$')
 
+# 宣言エントリ "foo", "foo[3:0]" などの先頭識別子
+LEADING_IDENT_RE = re.compile(r'^([A-Za-z_]\w*)')
+
+# 宣言の名前リストのカンマ分割（前後の空白ごと C 側で落とす）
+COMMA_SPLIT_RE = re.compile(r'\s*,\s*')
+
+# "bus[7]" 形式の 1 ビット参照（スライス圧縮用）
+COMPACT_BIT_RE = re.compile(r'^([A-Za-z_]\w*)\[(\d+)\]$')
+
+# "[7:0]" 形式の整数パックド次元
+WIDTH_RANGE_RE = re.compile(r'^\[\s*(\d+)\s*:\s*(\d+)\s*\]$')
+
 # 右辺/その他のトークン置換検出（スライスも拾う）
 IDENT_OR_INDEX_RE = re.compile(r'([A-Za-z_]\w*(?:\[\d+(?::\d+)?\])?)')
-DOUBLE_NEG_RE = re.compile(r'~\s*~\s*')
+
+# 右辺書き換え用: 直前の ~ の連なり (間の空白込み) も一緒に取り、
+# 置換結果の ~ と偶奇だけでその場で畳めるようにした変種
+NEG_IDENT_OR_INDEX_RE = re.compile(r'((?:~\s*)*)([A-Za-z_]\w*(?:\[\d+(?::\d+)?\])?)')
 
 # -------------------------
 # ヘルパ
@@ -76,9 +97,9 @@ def collect_decl_widths(src: str) -> Dict[str, str]:
         width = (m.group(3) or '').strip()
         if not width:
             continue
-        names = [p.strip() for p in m.group(4).split(',')]
+        names = COMMA_SPLIT_RE.split(m.group(4).strip())
         for name in names:
-            nm = re.match(r'^([A-Za-z_]\w*)', name)
+            nm = LEADING_IDENT_RE.match(name)
             if nm and nm.group(1) not in widths:
                 widths[nm.group(1)] = width
     for m in PORT_DECL_WITH_WIDTH_RE.finditer(src):
@@ -99,19 +120,22 @@ def parse_width_range(width: str) -> Optional[Tuple[int, int]]:
     """
     if not width:
         return None
-    m = re.match(r'^\[\s*(\d+)\s*:\s*(\d+)\s*\]$', width)
+    m = WIDTH_RANGE_RE.match(width)
     if not m:
         return None
     return int(m.group(1)), int(m.group(2))
 
-def decompose_lhs(lhs: str) -> Tuple[str, List[BitIndex]]:
+def decompose_lhs(lhs: str) -> Tuple[str, Sequence[BitIndex]]:
     """
-    Split an assignment LHS into `(base_name, [bit_indices...])`.
+    Split an assignment LHS into `(base_name, bit_indices)`.
 
     Examples:
         foo         -> ("foo", [None])
         foo[3]      -> ("foo", [3])
-        foo[7:4]    -> ("foo", [7, 6, 5, 4])
+        foo[7:4]    -> ("foo", range(7, 3, -1))
+
+    Slice indices stay a lazy `range` — len/zip/iteration all work on it and
+    wide vectors ([127:0], ...) avoid materializing one int per bit.
     """
     lhs = lhs.strip()
     m = INDEX_RE.match(lhs)
@@ -121,31 +145,21 @@ def decompose_lhs(lhs: str) -> Tuple[str, List[BitIndex]]:
     if m:
         name = m.group('name')
         hi, lo = int(m.group('hi')), int(m.group('lo'))
-        return name, list(iter_slice_indices(hi, lo))
+        return name, iter_slice_indices(hi, lo)
     # bare
     return BARE_RE.match(lhs).group('name'), [None]
 
-def parse_key_to_name_idx(tok: str) -> Tuple[str, BitIndex]:
-    """
-    Convert an identifier like `foo` or `foo[3]` into `(name, index)` where
-    scalars are represented as `None`.
-    """
-    m = INDEX_RE.match(tok)
-    if m:
-        return m.group('name'), int(m.group('i'))
-    return BARE_RE.match(tok).group('name'), None
-
 def render_token(base: str, idx: BitIndex) -> str:
     """Render `(base, idx)` back into `base` or `base[idx]`."""
     return base if idx is None else f"{base}[{idx}]"
 
 # -------------------------
-# RHS 展開: 右辺を LHS のビット列長に合わせて [(src_key_str, invert)] に展開
+# RHS 展開: 右辺を LHS のビット列長に合わせて [((name, idx), invert)] に展開
 # -------------------------
-def explode_rhs_as_refs(rhs: str, lhs_bits: int) -> Optional[List[Tuple[str,bool]]]:
+def explode_rhs_as_refs(rhs: str, lhs_bits: int) -> Optional[List[Tuple[BitRef, bool]]]:
     """
-    Expand the RHS expression into a list of `(token, invert)` pairs whose
-    length matches `lhs_bits`.
+    Expand the RHS expression into a list of `((name, idx), invert)` pairs
+    whose length matches `lhs_bits`.
 
     Handles single identifiers, indexed bits, slices, and replication forms
     like `{4{foo}}`, propagating explicit bit widths so that each LHS bit knows
@@ -174,125 +188,201 @@ def explode_rhs_as_refs(rhs: str, lhs_bits: int) -> Optional[List[Tuple[str,bool
     if m:
         name = m.group('name')
         hi, lo = int(m.group('hi')), int(m.group('lo'))
-        bits = [f"{name}[{i}]" for i in iter_slice_indices(hi, lo)]
-        if len(bits) != lhs_bits:
+        idxs = iter_slice_indices(hi, lo)
+        if len(idxs) != lhs_bits:
             return None
-        return [(b, inv_all) for b in bits]
+        return [((name, i), inv_all) for i in idxs]
 
     m = INDEX_RE.match(rhs)
     if m:
-        b = rhs
-        return [(b, inv_all)] * lhs_bits
+        return [((m.group('name'), int(m.group('i'))), inv_all)] * lhs_bits
 
     m = BARE_RE.match(rhs)
     if m:
-        b = rhs
-        return [(b, inv_all)] * lhs_bits
+        return [((rhs, None), inv_all)] * lhs_bits
 
     return None
 
 # -------------------------
-# replace_map を二段マップで作成
+# replace_map をフラットマップで作成
 # -------------------------
-def build_replace_map(src: str, lhs_pat: str, skip_ports: set, decl_widths: Dict[str, str]) -> BitMap:
+def build_replace_map(assign_matches: List[re.Match], lhs_re: re.Pattern, skip_ports: set,
+                      width_ranges: Dict[str, Tuple[int, int]]) -> BitMap:
     """
     Build the raw map from targeted assign LHS bits to their driving expression.
 
-    Each entry takes the form `map[base][bit_idx] = ("src_token", invert)` where
+    `assign_matches` is the file-wide list of `ASSIGN_RE` matches, scanned once
+    by the caller and shared with `collect_assign_lhs_names`.
+
+    Each entry takes the form `map[(base, bit_idx)] = ((src_name, src_idx), invert)` where
     `bit_idx` is `None` for unsliced assignments. When the declaration width is
     a literal range such as `[3:0]`, full-vector assignments are expanded to the
     appropriate per-bit keys so later slice references (e.g. `foo[2:1]`) can
     still resolve correctly.
     """
-    pat = re.compile(lhs_pat)
-    mp: BitMap = defaultdict(dict)
+    mp: BitMap = {}
 
-    for m in ASSIGN_RE.finditer(src):
+    for m in assign_matches:
         lhs = m.group('lhs').strip()
-        rhs = m.group('rhs').strip()
 
-        base, lhs_idx_list = decompose_lhs(lhs)
+        # 典型的なファイルでは大半の assign が対象外なので、
+        # 添字展開 (decompose_lhs) の前に先頭識別子だけ見て振り落とす
+        bm = LEADING_IDENT_RE.match(lhs)
+        if not bm:
+            continue
+        base = bm.group(1)
         if base in skip_ports:
             continue
-        if not pat.search(base):
+        if not lhs_re.search(base):
             continue
 
+        rhs = m.group('rhs').strip()
+        base, lhs_idx_list = decompose_lhs(lhs)
+
         if lhs_idx_list == [None]:
-            inferred = parse_width_range(decl_widths.get(base, ''))
+            inferred = width_ranges.get(base)
             if inferred:
                 hi, lo = inferred
-                lhs_idx_list = list(iter_slice_indices(hi, lo))
+                lhs_idx_list = iter_slice_indices(hi, lo)
 
         rhs_refs = explode_rhs_as_refs(rhs, len(lhs_idx_list))
         if not rhs_refs:
             continue
 
-        for dst_idx, (src_key, inv) in zip(lhs_idx_list, rhs_refs):
-            mp[base][dst_idx] = (src_key, inv)
+        for dst_idx, (src_ref, inv) in zip(lhs_idx_list, rhs_refs):
+            mp[(base, dst_idx)] = (src_ref, inv)
 
-    return dict(mp)
+    return mp
 
 # -------------------------
-# 再帰解決（二段マップ版）
+# 再帰解決（フラットマップ版）
 # -------------------------
-def resolve_final(src_map: BitMap, base: str, idx: int, seen=None) -> Tuple[str, bool]:
+def resolve_final(src_map: BitMap, base: str, idx: BitIndex, seen=None) -> Tuple[BitRef, bool]:
     """
-    Recursively resolve `(base, idx)` until it reaches a token that no longer
-    appears in `src_map`, folding inversion bits along the path.
+    Resolve `(base, idx)` until it reaches a reference that no longer appears
+    in `src_map`, folding inversion bits along the path. Iterative, so deep
+    repeater chains cost one loop step per hop instead of a Python frame.
     """
     if seen is None:
         seen = set()
     key = (base, idx)
-    if key in seen:
-        return (render_token(base, idx), False)  # ループ回避
-    seen.add(key)
-
-    if base not in src_map or idx not in src_map[base]:
-        return (render_token(base, idx), False)
-
-    nxt_key_str, inv = src_map[base][idx]
-    nbase, nidx = parse_key_to_name_idx(nxt_key_str)
-
-    final_key_str, inv2 = resolve_final(src_map, nbase, nidx, seen)
-    return (final_key_str, inv ^ inv2)
+    inv_acc = False
+    while True:
+        if key in seen:
+            return (key, inv_acc)  # ループ回避
+        entry = src_map.get(key)
+        if entry is None:
+            return (key, inv_acc)
+        seen.add(key)
+        nxt_ref, inv = entry
+        inv_acc ^= inv
+        key = nxt_ref
+
+def _resolve_cached(src_map: BitMap, base: str, idx: BitIndex,
+                    cache: Dict[BitRef, Tuple[BitRef, bool]]) -> Tuple[BitRef, bool]:
+    """
+    Resolve `(base, idx)` like `resolve_final` but record the result for every
+    node on the walked chain (union-find style path compression), so each
+    chain is traversed only once across a whole `make_final_map` run.
+    """
+    key = (base, idx)
+    path: List[Tuple[BitRef, bool]] = []
+    on_path = set()
+    cur = key
+    while True:
+        cached = cache.get(cur)
+        if cached is not None:
+            result = cached
+            break
+        entry = src_map.get(cur)
+        if entry is None:
+            result = (cur, False)
+            cache[cur] = result
+            break
+        if cur in on_path:
+            # 組合せループ: 従来どおり開始キー毎の解決に任せる
+            # （ループ絡みの結果は開始点依存なのでキャッシュしない）
+            return resolve_final(src_map, base, idx)
+        on_path.add(cur)
+        nxt_ref, inv = entry
+        path.append((cur, inv))
+        cur = nxt_ref
+
+    # 末端から親へ反転ビットを畳み込みながら、経路上の全ノードを記録する
+    ref, inv_acc = result
+    for node, inv in reversed(path):
+        inv_acc ^= inv
+        cache[node] = (ref, inv_acc)
+    return cache[key]
 
 def make_final_map(src_map: BitMap) -> BitMap:
     """
     Apply `resolve_final` to every `(base, bit_idx)` combination so later
     lookups can be constant-time dictionary reads instead of recursive walks.
+
+    Long copy1→copy2→…→copyN repeater chains previously cost O(N²) because
+    every key re-walked its whole chain; sharing a resolution cache across
+    keys makes the pass linear in the number of chain nodes.
     """
-    out: BitMap = {}
-    for base, inner in src_map.items():
-        out_inner: Dict[int, Tuple[str, bool]] = {}
-        for idx in inner.keys():
-            out_inner[idx] = resolve_final(src_map, base, idx)
-        out[base] = out_inner
-    return out
+    cache: Dict[BitRef, Tuple[BitRef, bool]] = {}
+    return {key: _resolve_cached(src_map, key[0], key[1], cache)
+            for key in src_map}
 
 # -------------------------
-# 置換テーブル作成（二段マップ→トークン→置換文字列）
+# 置換テーブル作成（フラットマップ→トークン→置換文字列）
 # -------------------------
-def build_repl_table(final_map: BitMap) -> Dict[str, str]:
+def build_repl_table(final_map: BitMap) -> Dict[BitRef, str]:
     """
-      "name" / "name[i]" -> "base" or "~base" or "foo[j]" / "~foo[j]" を生成
+      (name, idx) -> "base" or "~base" or "foo[j]" / "~foo[j]" を生成
+
+    キーを "name[i]" の文字列ではなくパース済みの (name, idx) にしておくと、
+    引く側がビットごとに同じ文字列を組み立て直さずに済む。
     """
-    table: Dict[str, str] = {}
-    for base, inner in final_map.items():
-        for idx, (src_key, inv) in inner.items():
-            tok = render_token(base, idx)
-            table[tok] = f"~{src_key}" if inv else src_key
+    table: Dict[BitRef, str] = {}
+    for (base, idx), ((sbase, sidx), inv) in final_map.items():
+        src_key = render_token(sbase, sidx)
+        table[(base, idx)] = f"~{src_key}" if inv else src_key
     return table
 
 # -------------------------
 # 文字列置換系（既存ロジックを流用）
 # -------------------------
 def collapse_double_neg(expr: str) -> str:
-    """Repeatedly remove `~~foo` style constructs that may appear post-rewrite."""
-    prev = None
-    while prev != expr:
-        prev = expr
-        expr = DOUBLE_NEG_RE.sub('', expr)
-    return expr
+    """Remove `~~foo` style constructs that may appear post-rewrite."""
+    # `~` が 1 個以下なら潰せるペアが存在しない（大半の式はここで帰る）
+    if expr.count('~') < 2:
+        return expr
+    # 旧実装は `~\s*~\s*` を不動点まで sub していたので連なりの深さぶん
+    # 全体を再走査していた。ここでは 1 パスで `~` の連なり（間の空白込み）を
+    # 数え、偶奇だけで出力を決める。
+    out: List[str] = []
+    i = 0
+    n = len(expr)
+    while i < n:
+        ch = expr[i]
+        if ch != '~':
+            out.append(ch)
+            i += 1
+            continue
+        count = 0
+        j = i
+        while j < n and expr[j] == '~':
+            count += 1
+            j += 1
+            k = j
+            while k < n and expr[k].isspace():
+                k += 1
+            if k < n and expr[k] == '~':
+                j = k
+        if count % 2:
+            out.append('~')
+        else:
+            # 偶数個の連なりは直後の空白ごと消える
+            # （`~\s*~\s*` の後続 \s* と同じ挙動に合わせる）
+            while j < n and expr[j].isspace():
+                j += 1
+        i = j
+    return ''.join(out)
 
 def _compact_slice_from_parts(parts: List[str]) -> Optional[str]:
     """
@@ -304,7 +394,7 @@ def _compact_slice_from_parts(parts: List[str]) -> Optional[str]:
         return None
     parsed = []
     for p in parts:
-        m = re.match(r'^([A-Za-z_]\w*)\[(\d+)\]$', p.strip())
+        m = COMPACT_BIT_RE.match(p.strip())
         if not m:
             return None
         parsed.append((m.group(1), int(m.group(2))))
@@ -324,19 +414,41 @@ def _compact_slice_from_parts(parts: List[str]) -> Optional[str]:
     name = parsed[0][0]
     return f"{name}[{hi}:{lo}]"
 
-def _assemble_parts(name: str, idxs, repl_table: Dict[str, str]) -> List[str]:
+def _assemble_parts(name: str, idxs, repl_table: Dict[BitRef, str]) -> List[str]:
     parts: List[str] = []
     for idx in idxs:
-        key = f"{name}[{idx}]"
-        parts.append(repl_table.get(key, key))
+        hit = repl_table.get((name, idx))
+        parts.append(hit if hit is not None else f"{name}[{idx}]")
     return parts
 
-def _replace_token(tok: str, repl_table: Dict[str, str], decl_widths: Dict[str, str], allow_vector_assembly: bool) -> str:
+def _replace_token(tok: str, repl_table: Dict[BitRef, str],
+                   width_ranges: Dict[str, Tuple[int, int]],
+                   allow_vector_assembly: bool, cache: Optional[Dict[str, str]] = None) -> str:
     """
     Replace identifiers (scalar, indexed, or sliced) using the bit-level table.
 
-    Slices are expanded bit-by-bit, rewritten, then compacted back into either
-    a replication literal or another slice when possible.
+    `cache` memoizes `tok -> rewritten string` across a rewrite pass: the same
+    vector base typically recurs many times per file and the tables never
+    change mid-pass, so the O(width) assemble-and-compact work only runs once
+    per unique token. Callers must use separate caches for the two
+    `allow_vector_assembly` flavours.
+    """
+    if cache is not None:
+        hit = cache.get(tok)
+        if hit is not None:
+            return hit
+    result = _replace_token_uncached(tok, repl_table, width_ranges, allow_vector_assembly)
+    if cache is not None:
+        cache[tok] = result
+    return result
+
+def _replace_token_uncached(tok: str, repl_table: Dict[BitRef, str],
+                            width_ranges: Dict[str, Tuple[int, int]],
+                            allow_vector_assembly: bool) -> str:
+    """
+    Uncached core of `_replace_token`. Slices are expanded bit-by-bit,
+    rewritten, then compacted back into either a replication literal or
+    another slice when possible.
     """
     m = SLICE_RE.match(tok)
     if m:
@@ -354,12 +466,12 @@ def _replace_token(tok: str, repl_table: Dict[str, str], decl_widths: Dict[str,
         if compact:
             return compact
         return "{" + ", ".join(parts) + "}"
-    if tok in repl_table:
-        return repl_table[tok]
-    if allow_vector_assembly:
-        rng = parse_width_range(decl_widths.get(tok, ''))
-    else:
-        rng = None
+    im = INDEX_RE.match(tok)
+    ref = (im.group('name'), int(im.group('i'))) if im else (tok, None)
+    hit = repl_table.get(ref)
+    if hit is not None:
+        return hit
+    rng = width_ranges.get(tok) if allow_vector_assembly else None
     if rng:
         hi, lo = rng
         parts = _assemble_parts(tok, iter_slice_indices(hi, lo), repl_table)
@@ -381,19 +493,33 @@ def _should_collapse_lhs(slice_m, new_rhs: str) -> bool:
     bare name. We only do so when the RHS turned into a replication literal,
     meaning every bit carries the same driver.
     """
-    expr = new_rhs.strip()
-    if not expr:
+    # assign 行ごとに呼ばれるので、strip のコピーを作らず
+    # 両端の非空白位置を添字で探して直接判定する
+    l = 0
+    r = len(new_rhs) - 1
+    while l <= r and new_rhs[l].isspace():
+        l += 1
+    if l > r:
         return False
-    if expr.startswith('{') and expr.endswith('}') and ',' not in expr:
-        return True
-    return False
+    while new_rhs[r].isspace():
+        r -= 1
+    return (new_rhs[l] == '{' and new_rhs[r] == '}'
+            and new_rhs.find(',', l, r + 1) == -1)
 
-def replace_in_rhs_only(line: str, repl_table: Dict[str, str], decl_widths: Dict[str, str]) -> str:
+def replace_in_rhs_only(line: str, repl_table: Dict[BitRef, str],
+                        width_ranges: Dict[str, Tuple[int, int]],
+                        m: Optional[re.Match] = None,
+                        cache: Optional[Dict[str, str]] = None) -> str:
     """
     Rewrite only the RHS of an `assign` statement using the replacement table,
     keep indentation/comments, and optionally collapse the LHS slice.
+
+    Callers that already matched `ASSIGN_RE` against the line can hand the
+    match object in via `m` to avoid re-running the regex, and can share a
+    token-rewrite `cache` across lines (see `_replace_token`).
     """
-    m = ASSIGN_RE.match(line)
+    if m is None:
+        m = ASSIGN_RE.match(line)
     if not m:
         return line
     lhs = m.group('lhs')
@@ -404,47 +530,81 @@ def replace_in_rhs_only(line: str, repl_table: Dict[str, str], decl_widths: Dict
     slice_m = SLICE_RE.match(lhs.strip())
 
     def repl_token(match):
-        """Regex callback that swaps tokens using the replacement table."""
-        tok = match.group(1)
-        return _replace_token(tok, repl_table, decl_widths, allow_vector_assembly=True)
-
-    new_rhs = IDENT_OR_INDEX_RE.sub(repl_token, rhs)
-    new_rhs = collapse_double_neg(new_rhs)
+        """Regex callback that swaps tokens and folds leading `~` runs on the spot."""
+        neg = match.group(1)
+        tok = match.group(2)
+        rep = _replace_token(tok, repl_table, width_ranges, allow_vector_assembly=True,
+                             cache=cache)
+        n_inv = neg.count('~')
+        rep_inv = rep.startswith('~')
+        if n_inv == 0 or (n_inv == 1 and not rep_inv):
+            # ~ なし、または畳む相手のいない単独 ~ は空白ごとそのまま
+            return neg + rep
+        # 連なり (置換結果の ~ 込み) を偶奇だけ残して潰す。
+        # collapse_double_neg と同じく、間の空白は落とし末尾 ~ の後ろの
+        # 空白だけ奇数時に残す
+        if rep_inv:
+            trailing = ''
+            body = rep[1:]
+        else:
+            trailing = neg[neg.rindex('~') + 1:]
+            body = rep
+        if (n_inv + rep_inv) & 1:
+            return '~' + trailing + body
+        return body
+
+    new_rhs = NEG_IDENT_OR_INDEX_RE.sub(repl_token, rhs)
+    # トークン前の ~ 連なりは上で畳んであるので、残るのは `~~(` のように
+    # 識別子が直後に来ないものだけ。count の早期 return で大半は素通りする
+    if new_rhs.count('~') >= 2:
+        new_rhs = collapse_double_neg(new_rhs)
     if slice_m and _should_collapse_lhs(slice_m, new_rhs):
         base = slice_m.group('name')
-        width = decl_widths.get(base)
-        if width:
-            slice_txt = f"[{slice_m.group('hi')}:{slice_m.group('lo')}]"
-            if width.replace(' ', '') == slice_txt.replace(' ', ''):
-                lhs_render = base
+        rng = width_ranges.get(base)
+        # パース済みの (hi, lo) 同士の比較なので文字列整形の違いに左右されない
+        if rng == (int(slice_m.group('hi')), int(slice_m.group('lo'))):
+            lhs_render = base
     suffix = f" {comment}" if comment else ""
     return f"{indent}assign {lhs_render} = {new_rhs};{suffix}"
 
-def global_replace_line(line: str, repl_table: Dict[str, str], decl_widths: Dict[str, str]) -> str:
-    """Perform identifier replacement across an arbitrary line (non-assign)."""
+def global_replace_line(line: str, repl_table: Dict[BitRef, str],
+                        width_ranges: Dict[str, Tuple[int, int]],
+                        cache: Optional[Dict[str, str]] = None,
+                        token_re: re.Pattern = IDENT_OR_INDEX_RE) -> str:
+    """
+    Perform identifier replacement across an arbitrary line (non-assign).
+
+    `token_re` defaults to the generic identifier pattern; callers that know
+    the replacement table up front can pass an alternation built from its base
+    names (see `main`) so tokens that can never be replaced are skipped inside
+    the regex engine instead of round-tripping through this callback.
+    """
     def repl_token(match):
         """Regex callback shared by global replacements."""
-        tok = match.group(1)
-        return _replace_token(tok, repl_table, decl_widths, allow_vector_assembly=False)
-    return IDENT_OR_INDEX_RE.sub(repl_token, line)
+        tok = match.group(0)
+        return _replace_token(tok, repl_table, width_ranges, allow_vector_assembly=False,
+                              cache=cache)
+    return token_re.sub(repl_token, line)
 
-def collect_assign_lhs_names(src: str, lhs_pat: str) -> set:
+def collect_assign_lhs_names(assign_matches: List[re.Match], lhs_re: re.Pattern) -> set:
     """
     Collect the set of base names that appear on the LHS of targeted assigns.
 
     Used later to determine which declarations/assignments can be pruned once
-    their nets become dead.
+    their nets become dead. Consumes the same `ASSIGN_RE` match list as
+    `build_replace_map` instead of rescanning the source.
     """
-    pat = re.compile(lhs_pat)
     names = set()
-    for m in ASSIGN_RE.finditer(src):
+    for m in assign_matches:
         lhs = m.group('lhs').strip()
         mm = INDEX_RE.match(lhs) or SLICE_RE.match(lhs) or BARE_RE.match(lhs)
         if not mm:
             continue
         base = mm.group('name')
-        if pat.search(base):
-            names.add(base)
+        if lhs_re.search(base):
+            # base 名は prune 側で大量の set/dict 照合にかけられるので
+            # intern してポインタ比較の速い経路に乗せる
+            names.add(sys.intern(base))
     return names
 
 def prune_unused_assigns_and_decls(src: str, target_names: set) -> str:
@@ -452,64 +612,101 @@ def prune_unused_assigns_and_decls(src: str, target_names: set) -> str:
     Remove redundant assign statements and declaration fragments for nets whose
     names appear in `target_names` but are no longer referenced elsewhere.
 
+    String-in/string-out wrapper around `_prune_lines` for callers that hold
+    the source as one blob; `main` feeds its line list to `_prune_lines`
+    directly and skips the split/join round-trip.
+    """
+    lines = src.splitlines(keepends=False)
+    out_lines = _prune_lines(lines, target_names)
+    if out_lines is lines:
+        return src
+    return '\n'.join(out_lines) + ('\n' if src.endswith('\n') else '')
+
+def _prune_lines(lines: List[str], target_names: set) -> List[str]:
+    """
+    Line-level core of the prune pass. Returns the input list object itself
+    when nothing needs removing, so callers can cheaply detect "no change".
+
     The analysis skips assign LHS tokens and declaration headers so we do not
     accidentally count the definitions themselves as "uses".
     """
-    lines = src.splitlines(keepends=False)
+    if not target_names:
+        return lines
+
+    target_names = {sys.intern(n) for n in target_names}
 
-    uses = {n: 0 for n in target_names}
-    is_assign_line = [False]*len(lines)
+    # 行分類のマッチ結果は 1 回だけ取り、集計・削除の両パスで使い回す
+    assign_matches: List[Optional[re.Match]] = [None]*len(lines)
+    decl_matches: List[Optional[re.Match]] = [None]*len(lines)
     assign_lhs_names_per_line: List[set] = [set() for _ in lines]
-    is_decl_line   = [False]*len(lines)
 
     for i, line in enumerate(lines):
-        if ASSIGN_RE.match(line):
-            is_assign_line[i] = True
-            lhs = ASSIGN_RE.match(line).group('lhs').strip()
-            mm = INDEX_RE.match(lhs) or SLICE_RE.match(lhs) or BARE_RE.match(lhs)
-            if mm:
-                base = mm.group('name')
-                assign_lhs_names_per_line[i].add(base)
-
-        if DECL_RE_LINE.match(line):
-            is_decl_line[i] = True
+        # 正規表現より桁違いに安い接頭辞チェックで先に振り分ける
+        # （assign 行と宣言行の先頭キーワードは排他）
+        stripped = line.lstrip()
+        if stripped.startswith('assign'):
+            am = ASSIGN_RE.match(line)
+            if am:
+                assign_matches[i] = am
+                lhs = am.group('lhs').strip()
+                mm = INDEX_RE.match(lhs) or SLICE_RE.match(lhs) or BARE_RE.match(lhs)
+                if mm:
+                    assign_lhs_names_per_line[i].add(mm.group('name'))
+        elif stripped.startswith(('wire', 'logic', 'reg')):
+            decl_matches[i] = DECL_RE_LINE.match(line)
+
+    # 全識別子をトークナイズして対象名と突き合わせる代わりに、対象名だけに
+    # マッチする選択肢 1 本の正規表現で行を直接走査する。対象外の行は
+    # findall が空を返すだけで済む。1 回でも使われた base は「残す」と
+    # 確定するので、全 base の使用が見つかった時点で走査自体を打ち切れる。
+    screen = re.compile(
+        r'\b(?:' + '|'.join(map(re.escape, sorted(target_names))) + r')\b')
+    unused = set(target_names)
 
     for i, line in enumerate(lines):
-        tokens = IDENT_OR_INDEX_RE.findall(line)
+        if not unused:
+            break
+        hits = screen.findall(line)
+        if not hits:
+            continue
         exclude = set()
-        if is_assign_line[i]:
+        if assign_matches[i]:
             exclude |= assign_lhs_names_per_line[i]
-        if is_decl_line[i]:
-            decl_m = DECL_RE_LINE.match(line)
-            if decl_m:
-                names_part = decl_m.group(4)
-                for name in re.findall(r'[A-Za-z_]\w*', names_part):
-                    exclude.add(name)
-
-        for t in tokens:
-            base = t.split('[')[0]
-            if base in target_names and base not in exclude:
-                uses[base] += 1
-
-    to_remove = {n for n, c in uses.items() if c == 0}
+        decl_m = decl_matches[i]
+        if decl_m:
+            # 削除パスと同じカンマ分割から先頭識別子だけを除外する。
+            # findall での再トークナイズ（添字内の識別子まで拾う）は不要。
+            names_part = decl_m.group(4)
+            for p in COMMA_SPLIT_RE.split(names_part.strip()):
+                nm = LEADING_IDENT_RE.match(p)
+                if nm:
+                    exclude.add(nm.group(1))
+
+        for base in hits:
+            base = sys.intern(base)
+            if base in unused and base not in exclude:
+                unused.discard(base)
+
+    to_remove = unused
     if not to_remove:
-        return src
+        return lines
 
     out_lines: List[str] = []
     for i, line in enumerate(lines):
-        if is_assign_line[i]:
-            lhs = ASSIGN_RE.match(line).group('lhs').strip()
+        am = assign_matches[i]
+        if am:
+            lhs = am.group('lhs').strip()
             base = (INDEX_RE.match(lhs) or SLICE_RE.match(lhs) or BARE_RE.match(lhs)).group('name')
             if base in to_remove:
                 continue  # drop
 
-        if is_decl_line[i]:
-            decl_m = DECL_RE_LINE.match(line)
+        decl_m = decl_matches[i]
+        if decl_m:
             names_part = decl_m.group(4)
-            parts = [p.strip() for p in names_part.split(',')]
+            parts = COMMA_SPLIT_RE.split(names_part.strip())
             keep_parts = []
             for p in parts:
-                nm = re.match(r'^([A-Za-z_]\w*)', p)
+                nm = LEADING_IDENT_RE.match(p)
                 if not nm:
                     keep_parts.append(p)
                     continue
@@ -520,67 +717,170 @@ def prune_unused_assigns_and_decls(src: str, target_names: set) -> str:
             if len(keep_parts) == 0:
                 continue
             else:
-                head = ''.join(line[:decl_m.start(4)])
-                tail = ''.join(line[decl_m.end(4):])
+                head = line[:decl_m.start(4)]
+                tail = line[decl_m.end(4):]
                 new_line = head + ', '.join(keep_parts) + tail
                 out_lines.append(new_line)
                 continue
 
         out_lines.append(line)
 
-    return '\n'.join(out_lines) + ('\n' if src.endswith('\n') else '')
+    return out_lines
+
+# unified diff のハンクヘッダ "@@ -l,c +l,c @@"
+HUNK_HEADER_RE = re.compile(r'^@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@')
+
+def _unified_diff_trimmed(a: List[str], b: List[str],
+                          fromfile: str, tofile: str, n: int = 3) -> str:
+    """
+    Render a unified diff of two line lists, feeding SequenceMatcher only the
+    window around the actual changes.
+
+    difflib compares the full inputs even when a multi-MB file changed in one
+    spot, so strip the common prefix/suffix first (keeping `n` context lines)
+    and re-offset the hunk headers afterwards. Identical inputs short-circuit
+    to an empty string.
+    """
+    na, nb = len(a), len(b)
+    lim = min(na, nb)
+    p = 0
+    while p < lim and a[p] == b[p]:
+        p += 1
+    if p == na == nb:
+        return ''
+    s = 0
+    slim = lim - p
+    while s < slim and a[na - 1 - s] == b[nb - 1 - s]:
+        s += 1
+
+    lo = max(0, p - n)
+    a_hi = min(na, na - s + n)
+    b_hi = min(nb, nb - s + n)
+
+    out: List[str] = []
+    for line in difflib.unified_diff(a[lo:a_hi], b[lo:b_hi],
+                                     fromfile=fromfile, tofile=tofile, n=n):
+        if lo:
+            hm = HUNK_HEADER_RE.match(line)
+            if hm:
+                line = (f"@@ -{int(hm.group(1)) + lo}{hm.group(2) or ''}"
+                        f" +{int(hm.group(3)) + lo}{hm.group(4) or ''} @@"
+                        + line[hm.end():])
+        out.append(line)
+    return ''.join(out)
 
 # -------------------------
 # main
 # -------------------------
-def main():
-    """CLI entrypoint for the repeater pruner."""
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    CLI entrypoint for the repeater pruner.
+
+    `argv` defaults to `sys.argv[1:]`; tests pass an explicit list to run the
+    tool in-process. Returns the process exit code.
+    """
     ap = argparse.ArgumentParser(description='Remove manual repeaters in Verilog by resolving copy/pow nets.')
     ap.add_argument('file', help='Input Verilog file')
     ap.add_argument('--lhs-pattern', required=True,
                     help=r'Regex for LHS base names to target (e.g. "(copy\d+|cpy\d+|pow\d+)")')
     ap.add_argument('--inplace', action='store_true', help='Overwrite the input file')
+    ap.add_argument('--no-diff', action='store_true',
+                    help='Skip computing/printing the unified diff')
     ap.add_argument('--encoding', default='utf-8')
-    args = ap.parse_args()
+    args = ap.parse_args(argv)
 
     with open(args.file, 'r', encoding=args.encoding) as f:
         orig = f.read()
 
-    lhs_pattern = args.lhs_pattern
+    # ユーザ指定パターンは任意に複雑になり得るので 1 回だけコンパイルして共有する
+    lhs_re = re.compile(args.lhs_pattern)
 
     ports = parse_ports(orig)
     decl_widths = collect_decl_widths(orig)
 
-    replace_map = build_replace_map(orig, lhs_pattern, ports, decl_widths)
+    # 幅文字列のパースは net ごとに 1 回で済ませ、以降の全パスには
+    # パース済みの (hi, lo) 辞書だけを引き回す
+    width_ranges: Dict[str, Tuple[int, int]] = {}
+    for name, width in decl_widths.items():
+        rng = parse_width_range(width)
+        if rng:
+            width_ranges[name] = rng
+
+    # assign 行の全文スキャンは 1 回だけ行い、マップ構築と削除対象収集で共有する
+    assign_matches = list(ASSIGN_RE.finditer(orig))
+
+    replace_map = build_replace_map(assign_matches, lhs_re, ports, width_ranges)
     final_map = make_final_map(replace_map)
     repl_table = build_repl_table(final_map)
 
+    # 置換対象の base 名をどれも含まない行は書き換えようがないので、
+    # 選択肢 1 本のスクリーニング正規表現で先に素通しする
+    target_bases = {name for name, _idx in repl_table}
+    screen = None
+    misc_token_re = IDENT_OR_INDEX_RE
+    if target_bases:
+        bases_alt = '|'.join(map(re.escape, sorted(target_bases)))
+        screen = re.compile(r'\b(?:' + bases_alt + r')\b')
+        # その他行の書き換えも対象 base 起点のトークンしか置換し得ないので、
+        # 汎用の識別子パターンではなくキー由来の選択肢で直接走査する
+        misc_token_re = re.compile(
+            r'\b(?:' + bases_alt + r')\b(?:\[\d+(?::\d+)?\])?')
+
+    # 同じトークンの組み立て直しを避けるため、書き換え結果をパス全体で共有する
+    # （vector 展開の可否で結果が変わるので assign 用とその他用で別キャッシュ）
+    rhs_tok_cache: Dict[str, str] = {}
+    misc_tok_cache: Dict[str, str] = {}
+
     lines = orig.splitlines(keepends=False)
     new_lines: List[str] = []
     for line in lines:
-        if ASSIGN_RE.match(line):
-            new_lines.append(replace_in_rhs_only(line, repl_table, decl_widths))
-        elif DECL_RE_LINE.match(line):
+        if screen is None or not screen.search(line):
+            new_lines.append(line)
+            continue
+        # 行分類のマッチ結果は 1 回だけ取り、assign 行は match を
+        # そのまま書き換え側に渡して再マッチを省く。正規表現の前には
+        # 安い接頭辞チェックを挟む
+        stripped = line.lstrip()
+        am = ASSIGN_RE.match(line) if stripped.startswith('assign') else None
+        if am:
+            new_lines.append(replace_in_rhs_only(line, repl_table, width_ranges, am,
+                                                 cache=rhs_tok_cache))
+        elif (stripped.startswith(('wire', 'logic', 'reg'))
+                and DECL_RE_LINE.match(line)):
             new_lines.append(line)
         else:
-            new_lines.append(global_replace_line(line, repl_table, decl_widths))
-    replaced = '\n'.join(new_lines) + ('\n' if orig.endswith('\n') else '')
-
-    target_bases = collect_assign_lhs_names(orig, lhs_pattern)
-    pruned = prune_unused_assigns_and_decls(replaced, target_bases)
-
-    diff = ''.join(difflib.unified_diff(
-        orig.splitlines(keepends=True),
-        pruned.splitlines(keepends=True),
-        fromfile=args.file + ' (before)',
-        tofile=args.file + ' (after)',
-        n=3
-    ))
-    print(diff, end='')
+            new_lines.append(global_replace_line(line, repl_table, width_ranges,
+                                                 cache=misc_tok_cache,
+                                                 token_re=misc_token_re))
+
+    # 行リストのまま prune に渡し、中間の全文 join/split を 1 往復省く
+    target_bases = collect_assign_lhs_names(assign_matches, lhs_re)
+    pruned_lines = _prune_lines(new_lines, target_bases)
+
+    # 出力は全文 1 本に join し直さず、keepends 形の行リストを直接組み立てて
+    # diff と書き出しの両方で使う（行に終端文字は残っていないので
+    # '\n'.join + splitlines(keepends=True) と同じ結果になる）
+    if orig.endswith('\n'):
+        pruned_ke = [l + '\n' for l in pruned_lines] if pruned_lines else ['\n']
+    else:
+        pruned_ke = [l + '\n' for l in pruned_lines]
+        if pruned_ke:
+            pruned_ke[-1] = pruned_lines[-1]
+
+    if not args.no_diff:
+        diff = _unified_diff_trimmed(
+            orig.splitlines(keepends=True),
+            pruned_ke,
+            fromfile=args.file + ' (before)',
+            tofile=args.file + ' (after)',
+            n=3
+        )
+        print(diff, end='')
 
     if args.inplace:
         with open(args.file, 'w', encoding=args.encoding) as f:
-            f.write(pruned)
+            f.writelines(pruned_ke)
+    return 0
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,28 @@
+# tests/conftest.py
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+# リポジトリ直下のスクリプトを普通の import で解決できるようにする。
+# spec_from_file_location + exec_module と違い、2 回目以降は sys.modules の
+# キャッシュに当たるだけで済む
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+
+@pytest.fixture(scope="session")
+def extract():
+    return importlib.import_module("extract")
+
+
+@pytest.fixture(scope="session")
+def inline_mod():
+    return importlib.import_module("inline")
+
+
+@pytest.fixture(scope="session")
+def sv_prune():
+    return importlib.import_module("sv_repeater_prune")
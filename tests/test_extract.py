@@ -1,21 +1,15 @@
 # tests/test_extract.py
-import sys
+import re
 import textwrap
 from pathlib import Path
-import subprocess
-import importlib.util
 
-# ==== helper: load extract.py as a module from repo root ====
-ROOT_DIR = Path(__file__).resolve().parents[1]
-EXTRACT_PATH = ROOT_DIR / "extract.py"
+import pytest
 
-def load_extract_module():
-    spec = importlib.util.spec_from_file_location("extract_mod", str(EXTRACT_PATH))
-    if spec is None or spec.loader is None:
-        raise RuntimeError(f"cannot load spec for {EXTRACT_PATH}")
-    mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
-    return mod
+# 生成結果の宣言/assign 行を 1 パスで抜き出すための正規表現
+DECL_LINE_RE = re.compile(
+    r"^\s*(?:input|output|inout|wire|logic|reg|assign)\b[^\n]*", re.M)
+
+# extract.py 本体は conftest.py のセッションフィクスチャ `extract` 経由でロードされる
 
 # ==== fixtures (Verilog sources) ====
 
@@ -141,87 +135,106 @@ module top;
 endmodule
 """
 
-def write(p: Path, s: str):
+# 上の定数は列 0 始まり（dedent 不要）なので、書き込み用に UTF-8 へ
+# 先にエンコードしておき、ファイル化のたびの dedent スキャン + encode を省く
+FOO_SV_B = FOO_SV.encode("utf-8")
+BAR_SV_B = BAR_SV.encode("utf-8")
+TOP_COMPLEX_B = TOP_COMPLEX.encode("utf-8")
+
+
+def write_b(p: Path, b: bytes):
     p.parent.mkdir(parents=True, exist_ok=True)
-    p.write_text(textwrap.dedent(s), encoding="utf-8")
+    p.write_bytes(b)
+
+
+@pytest.fixture(scope="module")
+def rtl_dir(tmp_path_factory):
+    """foo.sv / bar.sv を置いた読み取り専用の探索ディレクトリ。
+    中身はテスト間で共通なので、毎回書き直さずモジュール内で共有する"""
+    d = tmp_path_factory.mktemp("rtl")
+    write_b(d / "foo.sv", FOO_SV_B)
+    write_b(d / "bar.sv", BAR_SV_B)
+    return d
+
+
+@pytest.fixture(scope="module")
+def rtl_foo_only(tmp_path_factory):
+    """foo.sv だけを置いた探索ディレクトリ（複数 -I テスト用、読み取り専用）"""
+    d = tmp_path_factory.mktemp("rtl_foo")
+    write_b(d / "foo.sv", FOO_SV_B)
+    return d
+
+
+@pytest.fixture(scope="module")
+def ip_bar_only(tmp_path_factory):
+    """bar.sv だけを置いた探索ディレクトリ（複数 -I テスト用、読み取り専用）"""
+    d = tmp_path_factory.mktemp("ip_bar")
+    write_b(d / "bar.sv", BAR_SV_B)
+    return d
 
 # ==== tests ====
 
-def test_extract_complex_function_direct(tmp_path: Path):
+def test_extract_complex_function_direct(extract, rtl_dir):
     """複合ケース：.AAA(aaa[3:2]) のスライス→aaa が input、外部使用フィルタ、幅継承、LHS ローカル宣言"""
-    rtl = tmp_path / "rtl"
-    write(rtl / "foo.sv", FOO_SV)
-    write(rtl / "bar.sv", BAR_SV)
-    top = tmp_path / "top.sv"
-    write(top, TOP_COMPLEX)
-
-    extract = load_extract_module()
+    # top はファイル経由にする必要がないので、文字列をそのまま渡す
     out = extract.gen_extracted_module_from_dirs(
-        whole_src=top.read_text(encoding="utf-8"),
-        search_dirs=[rtl],
+        whole_src=TOP_COMPLEX,
+        search_dirs=[rtl_dir],
         new_mod_name="my_slice",
     )
 
+    # 宣言/assign 行を 1 パスで抜き出しておき、肯定条件は行集合側で検査する
+    # （out 全体を条件ごとに走査し直さない）
+    decls = [m.group(0).strip() for m in DECL_LINE_RE.finditer(out)]
+
+    def has_decl(prefix: str) -> bool:
+        return any(d.startswith(prefix) for d in decls)
+
     # ヘッダの input/output を含むか
     # 入力（スライス/親宣言の継承も確認）
-    assert "input [3:0] aaa" in out            # .AAA(aaa[3:2]) → base 'aaa'
-    assert "input bbb" in out
-    assert "input ddd" in out
-    assert "input ggg" in out
-    assert "input flag" in out
-    assert "input [15:0] bus_in" in out        # 親幅の継承
+    assert has_decl("input [3:0] aaa")          # .AAA(aaa[3:2]) → base 'aaa'
+    assert has_decl("input bbb")
+    assert has_decl("input ddd")
+    assert has_decl("input ggg")
+    assert has_decl("input flag")
+    assert has_decl("input [15:0] bus_in")      # 親幅の継承
     # 出力（外で使われるもののみ）
-    assert "output eee" in out
-    assert "output [15:0] bus_out" in out
-    # 外で使われない fff, w0 は出力に含まれない
+    assert has_decl("output eee")
+    assert has_decl("output [15:0] bus_out")
+    # 外で使われない fff, w0 は出力に含まれない（コメント等も含め全文で否定）
     assert "output fff" not in out
     # ローカル宣言（assign LHS でポート化されなかったもの）
-    assert "logic [3:0] bus_in_hi" in out or "logic bus_in_hi" in out
-    assert "assign bus_in_hi = bus_in[7:4];" in out
+    assert has_decl("logic [3:0] bus_in_hi") or has_decl("logic bus_in_hi")
+    assert has_decl("assign bus_in_hi = bus_in[7:4];")
     # モジュール本文がコピーされている（抜粋）
     assert "foo u_foo0(" in out and "bar u_bar0(" in out
 
-def test_extract_assign_only_block(tmp_path: Path):
+def test_extract_assign_only_block(extract, rtl_dir):
     """assign だけでも RHS→input, LHS(外部使用)→output が推論される"""
-    rtl = tmp_path / "rtl"
-    write(rtl / "foo.sv", FOO_SV)  # 使わないが探索先として存在させておく
-    top = tmp_path / "top.sv"
-    write(top, TOP_ASSIGN_ONLY)
-
-    extract = load_extract_module()
+    # rtl_dir は使わないが探索先として存在させておく
     out = extract.gen_extracted_module_from_dirs(
-        whole_src=top.read_text(encoding="utf-8"),
-        search_dirs=[rtl],
+        whole_src=TOP_ASSIGN_ONLY,
+        search_dirs=[rtl_dir],
         new_mod_name="slice_assign_only",
     )
     # 入力：RHS の bus_in、出力：LHS の bus_in_hi（外で使用されているので）
     assert "input [15:0] bus_in" in out
     assert "output [3:0] bus_in_hi" in out or "output bus_in_hi" in out
 
-def test_extract_multiple_moddirs_and_cli(tmp_path: Path):
-    """複数 -I の検索と CLI 実行の両方を検証"""
-    ip = tmp_path / "ip"
-    rtl = tmp_path / "rtl"
-    ip.mkdir(); rtl.mkdir()
-    # bar は ip 側に、foo は rtl 側に
-    write(ip / "bar.sv", BAR_SV)
-    write(rtl / "foo.sv", FOO_SV)
+def test_extract_multiple_moddirs_and_cli(tmp_path: Path, extract, rtl_foo_only, ip_bar_only):
+    """複数 -I の検索と CLI 実行の両方を検証（bar は ip 側に、foo は rtl 側に）"""
     top = tmp_path / "top.sv"
-    write(top, TOP_COMPLEX)
-
-    # CLI 実行
-    proc = subprocess.run(
-        [
-            sys.executable, str(EXTRACT_PATH),
-            str(top),
-            "-I", str(rtl),
-            "-I", str(ip),
-            "-o", str(tmp_path / "out.sv"),
-            "--name", "my_slice",
-        ],
-        capture_output=True, text=True
-    )
-    assert proc.returncode == 0
+    write_b(top, TOP_COMPLEX_B)
+
+    # CLI 実行（サブプロセスを起動せず main(argv) をインプロセスで呼ぶ）
+    rc = extract.main([
+        str(top),
+        "-I", str(rtl_foo_only),
+        "-I", str(ip_bar_only),
+        "-o", str(tmp_path / "out.sv"),
+        "--name", "my_slice",
+    ])
+    assert rc == 0
     txt = (tmp_path / "out.sv").read_text(encoding="utf-8")
     # 代表的な成果物
     assert "module my_slice(" in txt
@@ -229,16 +242,12 @@ def test_extract_multiple_moddirs_and_cli(tmp_path: Path):
     assert "output [15:0] bus_out" in txt
     assert "output fff" not in txt
 
-def test_extract_comment_and_decl_not_counted_as_use(tmp_path: Path):
+def test_extract_comment_and_decl_not_counted_as_use(extract, rtl_dir):
     """コメント・宣言に現れるだけのシンボルは外部使用と見なされない"""
     # bar は使う（w0 を S に接続）
-    write(tmp_path / "rtl/bar.sv", BAR_SV)
-    write(tmp_path / "top.sv", TOP_COMMENT_DECL_ONLY)
-
-    extract = load_extract_module()
     out = extract.gen_extracted_module_from_dirs(
-        whole_src=(tmp_path / "top.sv").read_text(encoding="utf-8"),
-        search_dirs=[tmp_path / "rtl"],
+        whole_src=TOP_COMMENT_DECL_ONLY,
+        search_dirs=[rtl_dir],
         new_mod_name="blk",
     )
     # w0 は宣言とコメントにしか出ないので output に入らない
@@ -246,9 +255,8 @@ def test_extract_comment_and_decl_not_counted_as_use(tmp_path: Path):
     header = out.split(");", 1)[0]
     assert "w0" not in header
 
-def test_extract_slice_input_detected(tmp_path: Path):
+def test_extract_slice_input_detected(extract, rtl_dir):
     """インスタンス接続 .AAA(aaa[3:2]) で base 'aaa' が input に入るかの単体チェック"""
-    write(tmp_path / "rtl/foo.sv", FOO_SV)
     # 最小の top
     src = """\
     module top;
@@ -265,21 +273,17 @@ def test_extract_slice_input_detected(tmp_path: Path):
       always @* if (eee) $display("x");
     endmodule
     """
-    write(tmp_path / "top.sv", src)
-
-    extract = load_extract_module()
     out = extract.gen_extracted_module_from_dirs(
-        whole_src=(tmp_path / "top.sv").read_text(encoding="utf-8"),
-        search_dirs=[tmp_path / "rtl"],
+        whole_src=textwrap.dedent(src),
+        search_dirs=[rtl_dir],
         new_mod_name="blk",
     )
     assert "input [3:0] aaa" in out
     assert "output eee" in out
 
 
-def test_extract_slice_input_detected(tmp_path: Path):
+def test_extract_slice_input_detected(extract, rtl_dir):
     """インスタンス接続 .AAA(aaa[3:2]) で base 'aaa' が input に入るかの単体チェック"""
-    write(tmp_path / "rtl/foo.sv", FOO_SV)
     # 最小の top
     src = """\
     module top;
@@ -296,12 +300,9 @@ def test_extract_slice_input_detected(tmp_path: Path):
       // @extract-end
     endmodule
     """
-    write(tmp_path / "top.sv", src)
-
-    extract = load_extract_module()
     out = extract.gen_extracted_module_from_dirs(
-        whole_src=(tmp_path / "top.sv").read_text(encoding="utf-8"),
-        search_dirs=[tmp_path / "rtl"],
+        whole_src=textwrap.dedent(src),
+        search_dirs=[rtl_dir],
         new_mod_name="blk",
     )
     print(out)
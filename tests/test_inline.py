@@ -1,20 +1,9 @@
 # tests/test_inline.py
-import sys
-import textwrap
 from pathlib import Path
-import subprocess
-import importlib.util
 
-ROOT_DIR = Path(__file__).resolve().parents[1]
-INLINE_PATH = ROOT_DIR / "inline.py"
+import pytest
 
-def load_inline_module():
-    spec = importlib.util.spec_from_file_location("inline_mod", str(INLINE_PATH))
-    if spec is None or spec.loader is None:
-        raise RuntimeError(f"cannot load spec for {INLINE_PATH}")
-    mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
-    return mod
+# inline.py 本体は conftest.py のセッションフィクスチャ `inline_mod` 経由でロードされる
 
 # --- 共通のテンプレ ---
 FOO_SV = """\
@@ -110,25 +99,41 @@ endmodule
 """
 
 
-def write(p: Path, s: str):
-    p.write_text(textwrap.dedent(s), encoding="utf-8")
+# 上の定数は列 0 始まり（dedent 不要）なので、書き込み用に UTF-8 へ
+# 先にエンコードしておき、ファイル化のたびの dedent スキャン + encode を省く
+FOO_SV_B = FOO_SV.encode("utf-8")
+BAR_SV_B = BAR_SV.encode("utf-8")
+TOP_INLINE_COLLISION_B = TOP_INLINE_COLLISION.encode("utf-8")
+TOP_NEED_BAR_B = TOP_NEED_BAR.encode("utf-8")
 
 
-def test_inline_basic_ok(tmp_path: Path):
-    """基本ケース: foo を inline、置換結果に (aaa[3:0]) / (bbb) / (|tmp) が現れることを確認"""
-    # 配置
-    (tmp_path / "rtl").mkdir()
-    write(tmp_path / "rtl" / "foo.sv", FOO_SV)
-    top = tmp_path / "top.sv"
-    write(top, TOP_INLINE_MARKED)
+def write_b(p: Path, b: bytes):
+    p.write_bytes(b)
+
+
+@pytest.fixture(scope="module")
+def rtl_dir(tmp_path_factory):
+    """foo.sv を置いた読み取り専用の探索ディレクトリ（テスト間で共有）"""
+    d = tmp_path_factory.mktemp("rtl")
+    write_b(d / "foo.sv", FOO_SV_B)
+    return d
 
-    # import inline.py
-    inline_mod = load_inline_module()
 
+@pytest.fixture(scope="module")
+def ip_bar_only(tmp_path_factory):
+    """bar.sv だけを置いた探索ディレクトリ（複数 -I テスト用、読み取り専用）"""
+    d = tmp_path_factory.mktemp("ip_bar")
+    write_b(d / "bar.sv", BAR_SV_B)
+    return d
+
+
+def test_inline_basic_ok(inline_mod, rtl_dir):
+    """基本ケース: foo を inline、置換結果に (aaa[3:0]) / (bbb) / (|tmp) が現れることを確認"""
+    # top はファイル経由にする必要がないので文字列をそのまま渡す
     new_src = inline_mod.inline_module(
-        (tmp_path / "top.sv").read_text(encoding="utf-8"),
+        TOP_INLINE_MARKED,
         mod_name="foo",
-        search_dirs=[tmp_path / "rtl"],
+        search_dirs=[rtl_dir],
         begin_pat=r"// @inline-begin",
         end_pat=r"// @inline-end",
     )
@@ -145,77 +150,53 @@ def test_inline_basic_ok(tmp_path: Path):
     assert " BBB " not in new_src
 
 
-def test_inline_detect_collision_and_abort_cli(tmp_path: Path):
+def test_inline_detect_collision_and_abort_cli(tmp_path: Path, inline_mod, rtl_dir, capsys):
     """衝突検出: foo の内部宣言 en/tmp が top で既に宣言 → 名前一覧を出力し非0終了"""
-    (tmp_path / "rtl").mkdir()
-    write(tmp_path / "rtl" / "foo.sv", FOO_SV)
-    write(tmp_path / "top.sv", TOP_INLINE_COLLISION)
-
-    # inline.py を CLI として実行
-    script = Path(__file__).resolve().parents[1] / "inline.py"
-    assert script.exists(), "inline.py がリポジトリ直下にある想定です"
-
-    proc = subprocess.run(
-        [
-            sys.executable, str(script),
-            str(tmp_path / "top.sv"),
-            "-I", str(tmp_path / "rtl"),
-            "--module", "foo",
-            "-o", str(tmp_path / "out.sv"),
-        ],
-        capture_output=True, text=True
-    )
+    write_b(tmp_path / "top.sv", TOP_INLINE_COLLISION_B)
+
+    # CLI と同じ main(argv) をインプロセスで実行
+    rc = inline_mod.main([
+        str(tmp_path / "top.sv"),
+        "-I", str(rtl_dir),
+        "--module", "foo",
+        "-o", str(tmp_path / "out.sv"),
+    ])
     # 衝突なので失敗終了（仕様では exit code 2 を使用）
-    assert proc.returncode != 0
+    assert rc != 0
     # 標準出力に衝突名（行区切り）を全て出す
-    out = proc.stdout.strip().splitlines()
+    out = capsys.readouterr().out.strip().splitlines()
     # 順不同可。集合で比較
     assert set(out) == {"en", "tmp"}
     # 出力ファイルは生成されない（または空）
     assert not (tmp_path / "out.sv").exists()
 
 
-def test_inline_multiple_moddirs(tmp_path: Path):
-    """探索ディレクトリが複数でも正しく解決されること"""
-    d1 = tmp_path / "ip"
-    d2 = tmp_path / "rtl"
-    d1.mkdir(); d2.mkdir()
-    # bar.sv は ip/ に置く
-    write(d1 / "bar.sv", BAR_SV)
-    write(tmp_path / "top.sv", TOP_NEED_BAR)
-
-    script = Path(__file__).resolve().parents[1] / "inline.py"
-    proc = subprocess.run(
-        [
-            sys.executable, str(script),
-            str(tmp_path / "top.sv"),
-            "-I", str(d2),
-            "-I", str(d1),
-            "--module", "bar",
-            "-o", str(tmp_path / "out.sv"),
-        ],
-        capture_output=True, text=True
-    )
-    assert proc.returncode == 0
+def test_inline_multiple_moddirs(tmp_path: Path, inline_mod, rtl_dir, ip_bar_only):
+    """探索ディレクトリが複数でも正しく解決されること（bar.sv は ip 側のみ）"""
+    write_b(tmp_path / "top.sv", TOP_NEED_BAR_B)
+
+    rc = inline_mod.main([
+        str(tmp_path / "top.sv"),
+        "-I", str(rtl_dir),
+        "-I", str(ip_bar_only),
+        "--module", "bar",
+        "-o", str(tmp_path / "out.sv"),
+    ])
+    assert rc == 0
     txt = (tmp_path / "out.sv").read_text(encoding="utf-8")
     assert "module bar" not in txt
     assert "(x)" in txt and "(y)" in txt  # ポート置換済み
 
 
-def test_inline_handles_slices_and_ops(tmp_path: Path):
+def test_inline_handles_slices_and_ops(inline_mod, rtl_dir):
     """スライス・演算を含む接続式でも (expr) で置換されること"""
-    (tmp_path / "rtl").mkdir()
-    write(tmp_path / "rtl" / "foo.sv", FOO_SV)
     # AAA にスライス、BBB に演算
     src = TOP_INLINE_MARKED.replace(".BBB(bbb)", ".BBB(aaa[0] & bbb)")
-    write(tmp_path / "top.sv", src)
-
-    inline_mod = load_inline_module()
 
     new_src = inline_mod.inline_module(
-        (tmp_path / "top.sv").read_text(encoding="utf-8"),
+        src,
         mod_name="foo",
-        search_dirs=[tmp_path / "rtl"],
+        search_dirs=[rtl_dir],
         begin_pat=r"// @inline-begin",
         end_pat=r"// @inline-end",
     )
@@ -224,19 +205,13 @@ def test_inline_handles_slices_and_ops(tmp_path: Path):
     assert "(aaa[0] & bbb)" in new_src  # 演算式も括弧で展開
 
 
-def test_inline_instance_not_found(tmp_path: Path):
+def test_inline_instance_not_found(inline_mod, rtl_dir):
     """マーカー内に対象モジュールのインスタンスが無ければエラー"""
-    (tmp_path / "rtl").mkdir()
-    write(tmp_path / "rtl" / "foo.sv", FOO_SV)
-    write(tmp_path / "top.sv", TOP_NO_INSTANCE)
-
-    inline_mod = load_inline_module()
-
     try:
         inline_mod.inline_module(
-            (tmp_path / "top.sv").read_text(encoding="utf-8"),
+            TOP_NO_INSTANCE,
             mod_name="foo",
-            search_dirs=[tmp_path / "rtl"],
+            search_dirs=[rtl_dir],
             begin_pat=r"// @inline-begin",
             end_pat=r"// @inline-end",
         )
@@ -1,120 +1,113 @@
 # tests/test_mp_normalize.py
 import textwrap
-from pathlib import Path
-import sys
+from itertools import zip_longest
 
-ROOT = Path(__file__).resolve().parents[1]
-if str(ROOT) not in sys.path:
-    sys.path.insert(0, str(ROOT))
+import pytest
+
+# リポジトリ直下への sys.path 追加は conftest.py が行う
 import mp_normalize as mp  # ← スクリプト名に合わせて変更してください
 
 
+def _d(s: str) -> str:
+    """フィクスチャ文字列の dedent。モジュール定数の定義時に 1 回だけ呼ぶ"""
+    return textwrap.dedent(s).lstrip("\n")
+
+
+def _norm(s: str) -> tuple:
+    """期待値を比較用の行タプルに正規化する（インポート時に 1 回だけ呼ぶ）"""
+    return tuple(l.rstrip() for l in textwrap.dedent(s).strip().splitlines())
+
+
 def _run_transform(src: str) -> str:
-    """テキスト -> transform -> テキスト"""
-    src = textwrap.dedent(src).lstrip("\n")
-    lines = [l + "\n" for l in src.splitlines()]
-    out_lines = mp.transform(lines)
+    """テキスト -> transform -> テキスト（src は dedent 済み前提）"""
+    # 行ごとの + "\n" 連結ではなく、終端ごと保持する C 実装の 1 パスで分割する
+    if src and not src.endswith("\n"):
+        src += "\n"
+    out_lines = mp.transform(src.splitlines(keepends=True))
     return "".join(out_lines)
 
 
-def _assert_verilog_equal(actual: str, expected: str):
-    """空白差などに多少寛容な比較"""
-    actual_lines = [l.rstrip() for l in actual.strip().splitlines()]
-    expected_lines = [
-        l.rstrip()
-        for l in textwrap.dedent(expected).lstrip("\n").strip().splitlines()
-    ]
-    assert actual_lines == expected_lines
-
-
-def test_case2_pair_with_declaration_and_index():
-    """m_ と p_ のペアがある場合:
-       - m_ の assign は削除
-       - p_ の assign に畳み込み
-       - 参照 m_[...] → ~p_[...] に変換
-       - 宣言から m_ を削除
-    """
-    src = """
+def _assert_verilog_equal(actual: str, expected_lines: tuple):
+    """空白差などに多少寛容な比較（expected は _norm 済みの行タプル）。
+    タプルを作り直さず zip_longest で流しながら比べ、最初の不一致で止める"""
+    actual_iter = (l.rstrip() for l in actual.strip().splitlines())
+    for i, (a, e) in enumerate(zip_longest(actual_iter, expected_lines), 1):
+        assert a == e, f"line {i}: {a!r} != {e!r}"
+
+
+_SRC_CASE2 = _d("""
     module top;
       wire [3:0] m_hoge, foo;
       assign m_hoge[3:0] = ~(a[3:0] & b[3:0]);
       assign p_hoge[3:0] = ~m_hoge[3:0];
       assign bar = m_hoge[2] | c;
     endmodule
-    """
-    expected = """
+    """)
+_EXP_CASE2 = _norm("""
     module top;
       wire [3:0] foo;
       assign p_hoge[3:0] = a[3:0] & b[3:0];
       assign bar = ~p_hoge[2] | c;
     endmodule
-    """
-    out = _run_transform(src)
-    _assert_verilog_equal(out, expected)
+    """)
 
 
-def test_case1_simple_rename_and_reference():
-    """m_ だけある場合:
-       - assign m_foo = ~(expr); → assign p_foo = expr;
-       - 宣言 m_foo → p_foo
-       - 参照 m_foo → ~p_foo
-    """
-    src = """
+# m_ と p_ のペアがある場合:
+#   - m_ の assign は削除 / p_ の assign に畳み込み
+#   - 参照 m_[...] → ~p_[...] に変換 / 宣言から m_ を削除
+
+
+_SRC_CASE1 = _d("""
     module top;
       wire m_foo;
       assign m_foo = ~(a & b);
       assign out = m_foo ^ d;
     endmodule
-    """
-    expected = """
+    """)
+_EXP_CASE1 = _norm("""
     module top;
       wire p_foo;
       assign p_foo = a & b;
       assign out = ~p_foo ^ d;
     endmodule
-    """
-    out = _run_transform(src)
-    _assert_verilog_equal(out, expected)
+    """)
 
 
-def test_existing_p_name_means_skip_m_assign():
-    """すでに p_base が存在する場合は m_base の変換をスキップする。"""
-    src = """
+# m_ だけある場合:
+#   - assign m_foo = ~(expr); → assign p_foo = expr;
+#   - 宣言 m_foo → p_foo / 参照 m_foo → ~p_foo
+
+
+_SRC_EXISTING_P = _d("""
     module top;
       wire m_bar, p_bar;
       assign m_bar = ~(a | b);
       assign out1 = m_bar;
       assign out2 = p_bar;
     endmodule
-    """
-    out = _run_transform(src)
-    # 何も変わらないはず
-    _assert_verilog_equal(out, src)
+    """)
+
 
+_EXP_EXISTING_P = _norm(_SRC_EXISTING_P)
 
-def test_multibit_with_index_rewritten_to_negated_p():
-    """複数ビット・ビット指定付きの m_sig[...] も ~p_sig[...] に変換される。"""
-    src = """
+
+_SRC_MULTIBIT = _d("""
     module top;
       logic [7:0] m_sig;
       assign m_sig[7:0] = ~(a[7:0]);
       assign x = m_sig[3] & m_sig[4];
     endmodule
-    """
-    expected = """
+    """)
+_EXP_MULTIBIT = _norm("""
     module top;
       logic [7:0] p_sig;
       assign p_sig[7:0] = a[7:0];
       assign x = ~p_sig[3] & ~p_sig[4];
     endmodule
-    """
-    out = _run_transform(src)
-    _assert_verilog_equal(out, expected)
+    """)
 
 
-def test_mixed_declaration_rename_and_delete():
-    """同じ宣言行に rename 対象と delete 対象と関係ない信号が混ざっているケース。"""
-    src = """
+_SRC_MIXED_DECL = _d("""
     module top;
       wire m_foo, m_bar, keep1;
       wire keep2;
@@ -123,10 +116,10 @@ def test_mixed_declaration_rename_and_delete():
       assign m_bar = ~(b);
       assign y = m_foo & m_bar & keep1 & keep2;
     endmodule
-    """
-    # foo は case1 (m_ だけ) → p_foo にリネーム + 参照 ~p_foo
-    # bar は case2 (m_ / p_ ペア) → m_bar の assign 削除 + p_bar に畳み込み + 宣言から m_bar 削除
-    expected = """
+    """)
+# foo は case1 (m_ だけ) → p_foo にリネーム + 参照 ~p_foo
+# bar は case2 (m_ / p_ ペア) → m_bar の assign 削除 + p_bar に畳み込み + 宣言から m_bar 削除
+_EXP_MIXED_DECL = _norm("""
     module top;
       wire p_foo, keep1;
       wire keep2;
@@ -134,34 +127,28 @@ def test_mixed_declaration_rename_and_delete():
       assign p_bar = b;
       assign y = ~p_foo & ~p_bar & keep1 & keep2;
     endmodule
-    """
-    out = _run_transform(src)
-    _assert_verilog_equal(out, expected)
+    """)
 
 
-def test_0():
-    src = """
+_SRC_0 = _d("""
     module top;
       wire m_foo, m_bar;
       assign m_foo = ~((a &b) & ~(a|~b));
       assign m_bar = ~b & a;
       assign y = m_foo & m_bar;
     endmodule
-    """
-    expected = """
+    """)
+_EXP_0 = _norm("""
     module top;
       wire p_foo, m_bar;
       assign p_foo = (a &b) & ~(a|~b);
       assign m_bar = ~b & a;
       assign y = ~p_foo & m_bar;
     endmodule
-    """
-    out = _run_transform(src)
-    _assert_verilog_equal(out, expected)
+    """)
 
 
-def test_1():
-    src = """
+_SRC_1 = _d("""
     module top;
       logic [3:0] m_foo;
       logic [3:0] a, b;
@@ -170,8 +157,8 @@ def test_1():
       assign m_bar = ~b & a;
       assign y = m_foo & {4{m_bar}};
     endmodule
-    """
-    expected = """
+    """)
+_EXP_1 = _norm("""
     module top;
       logic [3:0] p_foo;
       logic [3:0] a, b;
@@ -180,9 +167,7 @@ def test_1():
       assign m_bar = ~b & a;
       assign y = ~p_foo & {4{m_bar}};
     endmodule
-    """
-    out = _run_transform(src)
-    _assert_verilog_equal(out, expected)
+    """)
 
 
 # def test_2():
@@ -209,30 +194,25 @@ def test_1():
 #     _assert_verilog_equal(out, expected)
 
 
-def test_3():
-    src = """
+_SRC_3 = _d("""
     module top;
       logic [3:0] m_foo;
       logic [3:0] a, x, b, c;
       assign m_foo = ~(c & b);
       assign x = a & ~m_foo;
     endmodule
-    """
-    expected = """
+    """)
+_EXP_3 = _norm("""
     module top;
       logic [3:0] p_foo;
       logic [3:0] a, x, b, c;
       assign p_foo = c & b;
       assign x = a & p_foo;
     endmodule
-    """
-    out = _run_transform(src)
-    print(out)
-    _assert_verilog_equal(out, expected)
+    """)
 
 
-def test_4():
-    src = """
+_SRC_4 = _d("""
     module top;
       logic [3:0] m_hoge;
       logic [3:0] p_hoge;
@@ -242,15 +222,37 @@ def test_4():
       assign p_hoge[25:0] = ~m_hoge[20:0];
       assign p_hoge[55:30] = ~m_hoge[55:30];
     endmodule
-    """
-    expected = """
+    """)
+_EXP_4 = _norm("""
     module top;
       logic [3:0] p_hoge;
       logic [3:0] a, b;
       assign p_hoge[55:30] = a[55:30] | b[55:30];
       assign p_hoge[25:0] = a[25:0] | b[25:0];
     endmodule
-    """
+    """)
+
+
+# (id, src, expected_lines)。各ケースの意図は上の定数定義側のコメントを参照
+CASES = [
+    ("case2_pair_with_declaration_and_index", _SRC_CASE2, _EXP_CASE2),
+    ("case1_simple_rename_and_reference", _SRC_CASE1, _EXP_CASE1),
+    # すでに p_base が存在する場合は m_base の変換をスキップ（何も変わらない）
+    ("existing_p_name_means_skip_m_assign", _SRC_EXISTING_P, _EXP_EXISTING_P),
+    # 複数ビット・ビット指定付きの m_sig[...] も ~p_sig[...] に変換される
+    ("multibit_with_index_rewritten_to_negated_p", _SRC_MULTIBIT, _EXP_MULTIBIT),
+    # 同じ宣言行に rename 対象と delete 対象と関係ない信号が混ざっているケース
+    ("mixed_declaration_rename_and_delete", _SRC_MIXED_DECL, _EXP_MIXED_DECL),
+    ("0", _SRC_0, _EXP_0),
+    ("1", _SRC_1, _EXP_1),
+    ("3", _SRC_3, _EXP_3),
+    ("4", _SRC_4, _EXP_4),
+]
+
+
+@pytest.mark.parametrize("src,expected", [(c[1], c[2]) for c in CASES],
+                         ids=[c[0] for c in CASES])
+def test_transform(src, expected):
     out = _run_transform(src)
     print(out)
     _assert_verilog_equal(out, expected)
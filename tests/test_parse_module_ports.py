@@ -1,163 +1,177 @@
 # tests/test_parse_module_ports.py
-import importlib.util
-from pathlib import Path
 import textwrap
 
-ROOT_DIR = Path(__file__).resolve().parents[1]
-EXTRACT_PATH = ROOT_DIR / "extract.py"
+import pytest
 
+# extract.py 本体は conftest.py のセッションフィクスチャ `extract` 経由でロードされる
 
-def load_extract_module():
-    spec = importlib.util.spec_from_file_location("extract_mod", str(EXTRACT_PATH))
-    if spec is None or spec.loader is None:
-        raise RuntimeError(f"cannot load spec for {EXTRACT_PATH}")
-    mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
-    return mod
 
+def _d(s: str) -> str:
+    """フィクスチャ文字列の dedent。モジュール定数の定義時に 1 回だけ呼ぶ"""
+    return textwrap.dedent(s)
 
-def test_parse_ports_ansi_header_multiple_names_and_types():
+
+# ANSIポート宣言（ヘッダ内）で:
+# - input logic [7:0] a, b
+# - input signed [3:0] c
+# - output y
+# - inout wire [15:0] z
+# を正しく抽出し、順序（ヘッダの列挙順）も維持されることを確認
+_SRC_ANSI_HEADER = _d(
     """
-    ANSIポート宣言（ヘッダ内）で:
-    - input logic [7:0] a, b
-    - input signed [3:0] c
-    - output y
-    - inout wire [15:0] z
-    を正しく抽出し、順序も維持されることを確認
+    module m(
+      input logic [7:0]   a, b,
+      input signed [3:0]  c, /* comment */ // trailing
+      output              y,
+      inout wire [15:0]   z
+    );
+    // body
+    endmodule
     """
-    extract = load_extract_module()
-    src = textwrap.dedent(
-        """
-        module m(
-          input logic [7:0]   a, b,
-          input signed [3:0]  c, /* comment */ // trailing
-          output              y,
-          inout wire [15:0]   z
-        );
-        // body
-        endmodule
-        """
-    )
-    port_dir, order = extract.parse_module_ports(src)
-    # 順序はヘッダの列挙順
-    assert order == ["a", "b", "c", "y", "z"]
-    # 幅と方向
-    assert port_dir["a"] == ("input", "[7:0]")
-    assert port_dir["b"] == ("input", "[7:0]")
-    assert port_dir["c"] == ("input", "[3:0]")
-    assert port_dir["y"] == ("output", "")
-    assert port_dir["z"] == ("inout", "[15:0]")
+)
+_EXP_ANSI_HEADER = (
+    ["a", "b", "c", "y", "z"],
+    {
+        "a": ("input", "[7:0]"),
+        "b": ("input", "[7:0]"),
+        "c": ("input", "[3:0]"),
+        "y": ("output", ""),
+        "z": ("inout", "[15:0]"),
+    },
+)
 
 
-def test_parse_ports_non_ansi_body_multiple_on_one_line():
+# non-ANSI（本体側）で1行に複数名があっても分解できること
+_SRC_NON_ANSI_BODY = _d(
     """
-    non-ANSI（本体側）で1行に複数名があっても分解できること。
+    module m(a,b,c,y,z);
+      input [7:0] a, b   ,  /*comment*/ c;
+      output y;
+      inout  wire [15:0] z;
+    endmodule
     """
-    extract = load_extract_module()
-    src = textwrap.dedent(
-        """
-        module m(a,b,c,y,z);
-          input [7:0] a, b   ,  /*comment*/ c;
-          output y;
-          inout  wire [15:0] z;
-        endmodule
-        """
-    )
-    port_dir, order = extract.parse_module_ports(src)
-    assert order == ["a", "b", "c", "y", "z"]
-    assert port_dir["a"] == ("input", "[7:0]")
-    assert port_dir["b"] == ("input", "[7:0]")
-    assert port_dir["c"] == ("input", "[7:0]")
-    assert port_dir["y"] == ("output", "")
-    assert port_dir["z"] == ("inout", "[15:0]")
+)
+_EXP_NON_ANSI_BODY = (
+    ["a", "b", "c", "y", "z"],
+    {
+        "a": ("input", "[7:0]"),
+        "b": ("input", "[7:0]"),
+        "c": ("input", "[7:0]"),
+        "y": ("output", ""),
+        "z": ("inout", "[15:0]"),
+    },
+)
 
 
-def test_parse_ports_header_overrides_body_when_both_present():
+# ANSI と non-ANSI が両方あるときは **ANSI優先**で幅・方向が決まること。
+# （わざと本体側に異なる幅/方向を書いて上書きされないことを確認）
+_SRC_HEADER_OVERRIDES = _d(
     """
-    ANSI と non-ANSI が両方あるときは **ANSI優先**で幅・方向が決まること。
-    （わざと本体側に異なる幅/方向を書いて上書きされないことを確認）
+    module m(
+      input  logic [3:0] a,
+      output             y
+    );
+      // 本体側に異なる宣言を書いてもヘッダ優先で無視される
+      input  [7:0] a;   // <- 違う幅
+      inout       y;    // <- 違う方向
+    endmodule
     """
-    extract = load_extract_module()
-    src = textwrap.dedent(
-        """
-        module m(
-          input  logic [3:0] a,
-          output             y
-        );
-          // 本体側に異なる宣言を書いてもヘッダ優先で無視される
-          input  [7:0] a;   // <- 違う幅
-          inout       y;    // <- 違う方向
-        endmodule
-        """
-    )
-    port_dir, order = extract.parse_module_ports(src)
-    assert order == ["a", "y"]
-    assert port_dir["a"] == ("input", "[3:0]")  # ヘッダ優先
-    assert port_dir["y"] == ("output", "")      # ヘッダ優先（inout ではない）
+)
+_EXP_HEADER_OVERRIDES = (
+    ["a", "y"],
+    {
+        "a": ("input", "[3:0]"),  # ヘッダ優先
+        "y": ("output", ""),      # ヘッダ優先（inout ではない）
+    },
+)
 
 
-def test_parse_ports_header_segments_without_semicolons():
+# ヘッダ内はセミコロンが無くても、方向キーワード境界でセグメント化できること
+_SRC_NO_SEMICOLONS = _d(
     """
-    ヘッダ内はセミコロンが無くても、方向キーワード境界でセグメント化できること。
+    module m(input [1:0] a, b, output c, inout [2:0] d);
+    endmodule
     """
-    extract = load_extract_module()
-    src = textwrap.dedent(
-        """
-        module m(input [1:0] a, b, output c, inout [2:0] d);
-        endmodule
-        """
-    )
-    port_dir, order = extract.parse_module_ports(src)
-    assert order == ["a", "b", "c", "d"]
-    assert port_dir["a"] == ("input", "[1:0]")
-    assert port_dir["b"] == ("input", "[1:0]")
-    assert port_dir["c"] == ("output", "")
-    assert port_dir["d"] == ("inout", "[2:0]")
+)
+_EXP_NO_SEMICOLONS = (
+    ["a", "b", "c", "d"],
+    {
+        "a": ("input", "[1:0]"),
+        "b": ("input", "[1:0]"),
+        "c": ("output", ""),
+        "d": ("inout", "[2:0]"),
+    },
+)
 
 
-def test_parse_ports_comments_and_unpacked_are_ignored_for_names():
+# コメントや unpacked 配列/初期化子があっても識別子名だけが抽出されること。
+# 'arr' は unpacked 指定があっても base 名としては抽出対象（仕様：unpackedは幅には反映しない）
+# → _split_ident_list は base 部（識別子）を拾うため 'arr' も拾う
+_SRC_COMMENTS_UNPACKED = _d(
     """
-    コメントや unpacked 配列/初期化子があっても識別子名だけが抽出されること。
+    module m(
+      input  logic [7:0] a /*aa*/,  // cmt
+      input  logic [7:0] arr  [0:3] , b {foo},  // unpacked/初期化子混在
+      output y
+    );
+    endmodule
     """
-    extract = load_extract_module()
-    src = textwrap.dedent(
-        """
-        module m(
-          input  logic [7:0] a /*aa*/,  // cmt
-          input  logic [7:0] arr  [0:3] , b {foo},  // unpacked/初期化子混在
-          output y
-        );
-        endmodule
-        """
-    )
-    port_dir, order = extract.parse_module_ports(src)
-    # 'arr' は unpacked 指定があっても base 名としては抽出対象（仕様：unpackedは幅には反映しない）
-    # → _split_ident_list は base 部（識別子）を拾うため 'arr' も拾う
-    assert order == ["a", "arr", "b", "y"]
-    assert port_dir["a"] == ("input", "[7:0]")
-    assert port_dir["arr"] == ("input", "[7:0]")  # 幅は packed のみ適用
-    assert port_dir["b"] == ("input", "[7:0]")
-    assert port_dir["y"] == ("output", "")
+)
+_EXP_COMMENTS_UNPACKED = (
+    ["a", "arr", "b", "y"],
+    {
+        "a": ("input", "[7:0]"),
+        "arr": ("input", "[7:0]"),  # 幅は packed のみ適用
+        "b": ("input", "[7:0]"),
+        "y": ("output", ""),
+    },
+)
 
 
-def test_parse_ports_handles_inout_and_signed_tokens():
+# inout と signed のトークンがあっても吸収され、幅が正しく拾えること
+_SRC_INOUT_SIGNED = _d(
     """
-    inout と signed のトークンがあっても吸収され、幅が正しく拾えること。
+    module m(
+      inout signed [15:0] z0, z1,
+      input        [3:0]  s,
+      output               o
+    );
+    endmodule
     """
-    extract = load_extract_module()
-    src = textwrap.dedent(
-        """
-        module m(
-          inout signed [15:0] z0, z1,
-          input        [3:0]  s,
-          output               o
-        );
-        endmodule
-        """
-    )
+)
+_EXP_INOUT_SIGNED = (
+    ["z0", "z1", "s", "o"],
+    {
+        "z0": ("inout", "[15:0]"),
+        "z1": ("inout", "[15:0]"),
+        "s": ("input", "[3:0]"),
+        "o": ("output", ""),
+    },
+)
+
+
+# (id, src, 期待する順序, 期待する {name: (dir, width)})。
+# 各ケースの意図は上の定数定義側のコメントを参照
+PORT_CASES = [
+    ("ansi_header_multiple_names_and_types",
+     _SRC_ANSI_HEADER, *_EXP_ANSI_HEADER),
+    ("non_ansi_body_multiple_on_one_line",
+     _SRC_NON_ANSI_BODY, *_EXP_NON_ANSI_BODY),
+    ("header_overrides_body_when_both_present",
+     _SRC_HEADER_OVERRIDES, *_EXP_HEADER_OVERRIDES),
+    ("header_segments_without_semicolons",
+     _SRC_NO_SEMICOLONS, *_EXP_NO_SEMICOLONS),
+    ("comments_and_unpacked_are_ignored_for_names",
+     _SRC_COMMENTS_UNPACKED, *_EXP_COMMENTS_UNPACKED),
+    ("handles_inout_and_signed_tokens",
+     _SRC_INOUT_SIGNED, *_EXP_INOUT_SIGNED),
+]
+
+
+@pytest.mark.parametrize("src,exp_order,exp_dirs",
+                         [(c[1], c[2], c[3]) for c in PORT_CASES],
+                         ids=[c[0] for c in PORT_CASES])
+def test_parse_ports(extract, src, exp_order, exp_dirs):
     port_dir, order = extract.parse_module_ports(src)
-    assert order == ["z0", "z1", "s", "o"]
-    assert port_dir["z0"] == ("inout", "[15:0]")
-    assert port_dir["z1"] == ("inout", "[15:0]")
-    assert port_dir["s"]  == ("input", "[3:0]")
-    assert port_dir["o"]  == ("output", "")
+    assert order == exp_order
+    assert {n: p.as_tuple() for n, p in port_dir.items()} == exp_dirs
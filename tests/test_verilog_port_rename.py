@@ -77,7 +77,9 @@ def test_basic_non_ansi_module_and_instance_rewrite():
     assert port_info["HB92"].lsb == 0
     assert port_info["HOG1"].direction == "output"
 
-    port_to_internal, _, _ = vpr.analyse_assigns(body, header_ports, port_info)
+    port_to_internal, _, _, bridge_linenos = vpr.analyse_assigns(
+        body, header_ports, port_info
+    )
     # ポート名→内部信号名のマッピング
     assert port_to_internal == {
         "AB12": "p_abc12",
@@ -95,6 +97,7 @@ def test_basic_non_ansi_module_and_instance_rewrite():
         port_info=port_info,
         port_to_internal=port_to_internal,
         style="non-ansi",
+        bridge_linenos=bridge_linenos,
     )
 
     expected_mod = textwrap.dedent(
@@ -165,7 +168,8 @@ def test_basic_ansi_module():
 
     name, header_ports, body, pre, post = vpr.parse_module(module_src)
     port_info = vpr.parse_port_declarations(body, header_ports)
-    port_to_internal, _, _ = vpr.analyse_assigns(body, header_ports, port_info)
+    # bridge_linenos を渡さない場合は従来通り行毎に判定される（フォールバック経路）
+    port_to_internal, _, _, _ = vpr.analyse_assigns(body, header_ports, port_info)
 
     new_mod = vpr.build_new_module_text(
         name, header_ports, body, pre, post, port_info, port_to_internal, "ansi"
@@ -302,7 +306,7 @@ def test_port_covered_by_multiple_consistent_segments_ok():
     # ABC の宣言幅は [5:0] なので、分析関数的には
     # 「全ビットカバー」まではチェックしない（msb/lsb は分かるが、セグメントは[1:0]と[5:4]だけ）
     # -> 現実の仕様には依るが、このスクリプトではエラーにしない想定。
-    port_to_internal, _, _ = vpr.analyse_assigns(body, header_ports, port_info)
+    port_to_internal, _, _, _ = vpr.analyse_assigns(body, header_ports, port_info)
 
     assert port_to_internal["ABC"] == "p_a"
 
@@ -13,9 +13,12 @@ verilog_port_rename.py
 """
 
 import argparse
+import functools
+import hashlib
+import multiprocessing
+import pickle
 import re
 import sys
-from collections import defaultdict
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple, Set
 
@@ -27,10 +30,9 @@ class PortInfo:
     lsb: Optional[int]
 
 
-MODULE_RE = re.compile(
-    r'module\s+(\w+)\s*\((.*?)\);\s*(.*?)endmodule',
-    re.S
-)
+# module ヘッダだけ正規表現で拾い、ポートリスト終端と endmodule は
+# str.find で探す（本文全体に lazy 量指定子をかけない）
+MODULE_HDR_RE = re.compile(r'module\s+(\w+)\s*\(')
 
 ASSIGN_RE = re.compile(
     r'^\s*assign\s+([^=]+?)\s*=\s*([^;]+?)\s*;',
@@ -42,16 +44,62 @@ ASSIGN_LINE_RE = re.compile(
     r'^\s*assign\s+([^=]+?)\s*=\s*([^;]+?)\s*;\s*(?://.*)?$'
 )
 
+# named port 接続 .Port( の検出用（rewrite_instantiations で使う）
+PORT_CALL_RE = re.compile(r'\.(\w+)\s*\(')
+
+# 非 ANSI のポート宣言行（parse_port_declarations で使う）
+DECL_RE = re.compile(r'^\s*(input|output|inout)\b([^;]*);', re.M)
+
+# ポート宣言行の行頭判定（build_new_module_text で使う）。
+# lstrip().startswith(("input ", ...)) と同じ条件を割り当て無しで調べる
+DECL_HEAD_RE = re.compile(r'\s*(?:input|output|inout) ')
+
+# 幅 [msb:lsb] と識別子の抽出用
+RANGE_RE = re.compile(r'\[(\d+)\s*:\s*(\d+)\]')
+IDENT_RE = re.compile(r'[A-Za-z_]\w*')
+
+# parse_signal_ref 用: 'name' / 'name[idx]' / 'name[msb:lsb]' を 1 パターンで
+# （外形 → 括弧の中身と 2 段でマッチし直さない）
+SIGREF_RE = re.compile(
+    r'^([A-Za-z_]\w*)\s*(?:\[\s*(?:(\d+)\s*:\s*(\d+)|(\d+))\s*\])?$'
+)
+
+
+@functools.lru_cache(maxsize=128)
+def _inst_re(module_name: str) -> "re.Pattern[str]":
+    """module_name のインスタンス全体にマッチするパターン。
+    同じモジュール名で呼び直されることが多いのでコンパイル結果をキャッシュする。"""
+    return re.compile(
+        rf'(?P<full>'
+        rf'(?P<mod>{re.escape(module_name)})'
+        rf'\s*'
+        rf'(?P<params>#\s*\([^;]*?\)\s*)?'
+        rf'\s+'
+        rf'(?P<inst>\w+)'
+        rf'\s*\('
+        rf'(?P<ports>[^;]*?)'
+        rf'\);)',
+        re.S,
+    )
+
 
 def parse_module(text: str):
-    m = MODULE_RE.search(text)
+    # `module NAME ( ... ); ... endmodule` を 1 本の正規表現で取ると
+    # 2 つの lazy `.*?` がファイル全体を何度も舐め直すので、ヘッダ以外は
+    # 位置を直接探して線形時間で切り出す
+    m = MODULE_HDR_RE.search(text)
     if not m:
         raise SystemExit("Error: module が見つかりませんでした。")
     name = m.group(1)
-    header_ports_str = m.group(2)
-    body = m.group(3)
+    ports_end = text.find(');', m.end())
+    end_idx = text.find('endmodule', ports_end + 2) if ports_end >= 0 else -1
+    if end_idx < 0:
+        raise SystemExit("Error: module が見つかりませんでした。")
+    header_ports_str = text[m.end():ports_end]
+    # 元の正規表現の `;\s*(.*?)` と同じく、body 先頭の空白は含めない
+    body = text[ports_end + 2:end_idx].lstrip()
     pre = text[:m.start()]
-    post = text[m.end():]
+    post = text[end_idx + len('endmodule'):]
 
     # ヘッダのポート名一覧
     ports: List[str] = []
@@ -60,7 +108,7 @@ def parse_module(text: str):
         if not name_part:
             continue
         # ANSI っぽい書き方の場合もあるので最後の識別子を取る
-        tokens = re.findall(r'[A-Za-z_]\w*', name_part)
+        tokens = IDENT_RE.findall(name_part)
         if not tokens:
             continue
         ports.append(tokens[-1])
@@ -78,13 +126,12 @@ def parse_port_declarations(body: str, header_ports: List[str]) -> Dict[str, Por
     header_set = set(header_ports)
 
     # 行単位で input/output/inout を探す
-    decl_re = re.compile(r'^\s*(input|output|inout)\b([^;]*);', re.M)
-    for m in decl_re.finditer(body):
+    for m in DECL_RE.finditer(body):
         direction = m.group(1)
         rest = m.group(2)
 
         # 幅 [msb:lsb] を一つだけ拾う（複数あっても最初のだけ）
-        range_m = re.search(r'\[(\d+)\s*:\s*(\d+)\]', rest)
+        range_m = RANGE_RE.search(rest)
         msb = lsb = None
         if range_m:
             msb = int(range_m.group(1))
@@ -92,16 +139,22 @@ def parse_port_declarations(body: str, header_ports: List[str]) -> Dict[str, Por
             # 名前から幅の表記を消しておく
             rest = rest[:range_m.start()] + rest[range_m.end():]
 
-        # 残りから名前を抽出（カンマ区切り）
-        names = [n.strip() for n in rest.split(',') if n.strip()]
-        for name in names:
-            # 余分な単語（wire, reg, logic など）を排除して最後の識別子を採用
-            tokens = re.findall(r'[A-Za-z_]\w*', name)
-            if not tokens:
-                continue
-            ident = tokens[-1]
-            if ident in header_set:
-                port_info[ident] = PortInfo(direction=direction, msb=msb, lsb=lsb)
+        # カンマ区切りの各セグメントの「最後の識別子」を採用する
+        # （wire, reg, logic などの余分な単語は最後でないので自然に外れる）。
+        # split + セグメント毎の findall ではなく、識別子の finditer 1 パスと
+        # str.find で追うカンマ位置からセグメント境界を判定する
+        last_ident = None
+        next_comma = rest.find(',')
+        for im in IDENT_RE.finditer(rest):
+            while next_comma != -1 and im.start() > next_comma:
+                # セグメント境界を越えた: 直前のセグメントの識別子を確定
+                if last_ident is not None and last_ident in header_set:
+                    port_info[last_ident] = PortInfo(direction=direction, msb=msb, lsb=lsb)
+                last_ident = None
+                next_comma = rest.find(',', next_comma + 1)
+            last_ident = im.group()
+        if last_ident is not None and last_ident in header_set:
+            port_info[last_ident] = PortInfo(direction=direction, msb=msb, lsb=lsb)
 
     # header にあるのに宣言が見つからないものはエラー
     missing = [p for p in header_ports if p not in port_info]
@@ -119,25 +172,21 @@ def parse_signal_ref(expr: str):
     それ以外の複雑な式は None を返す。
     """
     expr = expr.strip()
-    m = re.match(r'^([A-Za-z_]\w*)\s*(\[[^]]+\])?$', expr)
+    # 参照の大半はビット指定の無い裸の名前なので、その場合は
+    # 正規表現エンジンを起動せずに返す
+    if expr.isidentifier():
+        return expr, None, None
+    m = SIGREF_RE.match(expr)
     if not m:
+        # 複雑な式や数値以外のビット指定は対象外
         return None
-    name = m.group(1)
-    bracket = m.group(2)
-    if not bracket:
-        return name, None, None
-    inside = bracket[1:-1].strip()
-    m2 = re.match(r'^(\d+)\s*:\s*(\d+)$', inside)
-    if m2:
-        msb = int(m2.group(1))
-        lsb = int(m2.group(2))
-        return name, msb, lsb
-    m3 = re.match(r'^(\d+)$', inside)
-    if m3:
-        idx = int(m3.group(1))
+    name, msb, lsb, idx = m.groups()
+    if msb is not None:
+        return name, int(msb), int(lsb)
+    if idx is not None:
+        idx = int(idx)
         return name, idx, idx
-    # その他は対象外
-    return None
+    return name, None, None
 
 
 def analyse_assigns(
@@ -151,16 +200,34 @@ def analyse_assigns(
         port_to_internal: ポート名 -> 内部信号名
         internal_to_ports: 内部信号名 -> {ポート名,...}
         port_segments: ポート名 -> List[ (msb, lsb) ]  (インデックス無し assign は None を格納)
+        bridge_linenos: ポート ↔ 内部信号の橋渡し assign がある body の行番号
+                        （build_new_module_text が削除対象の判定に使う）
     """
-    ports_set: Set[str] = set(header_ports)
+    # 変更しないので frozenset にし、ループ内の属性参照を省くため
+    # __contains__ をローカルに束縛しておく
+    ports_set = frozenset(header_ports)
+    is_port = ports_set.__contains__
     port_to_internal: Dict[str, str] = {}
-    internal_to_ports: Dict[str, Set[str]] = defaultdict(set)
-    port_segments: Dict[str, List[Optional[Tuple[int, int]]]] = defaultdict(list)
+    # 正常系では内部信号 1 つにポート 1 つなので、ループ中は set を作らず
+    # 「最初に見たポート」だけ覚え、2 つ目が来たときだけ conflict 側に集める
+    internal_owner: Dict[str, str] = {}
+    internal_conflicts: Dict[str, Set[str]] = {}
+    port_segments: Dict[str, List[Optional[Tuple[int, int]]]] = {}
+    bridge_linenos: Set[int] = set()
 
     problem_signals: Set[str] = set()
     other_errors: List[str] = []
 
+    # マッチ位置 → 行番号は、前回マッチからの改行数を足すだけで求める
+    # （マッチ毎に body 先頭から数え直さない）。^\s* は直前の空行から
+    # マッチを始めることがあるので、行番号は LHS の位置で数える
+    scan_pos = 0
+    lineno = 0
+
     for m in ASSIGN_RE.finditer(body):
+        lineno += body.count('\n', scan_pos, m.start(1))
+        scan_pos = m.start(1)
+
         lhs_raw, rhs_raw = m.group(1), m.group(2)
         lhs = parse_signal_ref(lhs_raw)
         rhs = parse_signal_ref(rhs_raw)
@@ -170,13 +237,17 @@ def analyse_assigns(
         lhs_name, lhs_msb, lhs_lsb = lhs
         rhs_name, rhs_msb, rhs_lsb = rhs
 
-        lhs_is_port = lhs_name in ports_set
-        rhs_is_port = rhs_name in ports_set
+        lhs_is_port = is_port(lhs_name)
+        rhs_is_port = is_port(rhs_name)
 
         # 両方ポート or 両方内部信号は無視
         if lhs_is_port == rhs_is_port:
             continue
 
+        # ここまで来たら橋渡し assign（後の整合性エラーはどのみち SystemExit する
+        # ので、削除対象の判定としてはこの時点で記録してよい）
+        bridge_linenos.add(lineno)
+
         if lhs_is_port:
             port_name = lhs_name
             p_msb, p_lsb = lhs_msb, lhs_lsb
@@ -227,24 +298,32 @@ def analyse_assigns(
             continue
 
         # internal -> ports の追跡（1:多 も検出する）
-        internal_to_ports[internal_name].add(port_name)
+        owner = internal_owner.get(internal_name)
+        if owner is None:
+            internal_owner[internal_name] = port_name
+        elif owner != port_name:
+            c = internal_conflicts.get(internal_name)
+            if c is None:
+                c = internal_conflicts[internal_name] = {owner}
+            c.add(port_name)
 
         # ポートのカバレッジ用にセグメントを記録
+        segs = port_segments.get(port_name)
+        if segs is None:
+            segs = port_segments[port_name] = []
         if p_msb is None:
             # インデックス指定無し = 全ビットとみなす（後で特別扱い）
-            port_segments[port_name].append(None)
+            segs.append(None)
         else:
-            hi, lo = p_msb, p_lsb
-            port_segments[port_name].append((hi, lo))
+            segs.append((p_msb, p_lsb))
 
     # internal が複数のポートに分割されている場合を検出
-    for internal_name, ports in internal_to_ports.items():
-        if len(ports) > 1:
-            problem_signals.add(internal_name)
-            other_errors.append(
-                f"内部信号 {internal_name} が複数のポートに分割接続されています: "
-                + ", ".join(sorted(ports))
-            )
+    for internal_name, ports in internal_conflicts.items():
+        problem_signals.add(internal_name)
+        other_errors.append(
+            f"内部信号 {internal_name} が複数のポートに分割接続されています: "
+            + ", ".join(sorted(ports))
+        )
 
     # 各ポートが全部覆われているかを確認
     for port_name in ports_set:
@@ -275,39 +354,50 @@ def analyse_assigns(
             # 念のため
             continue
 
-        bits_needed = set(range(min(info.msb, info.lsb), max(info.msb, info.lsb) + 1))
-        bits_mapped: Set[int] = set()
+        # ビット集合は set ではなく整数のビットマスクで持つ
+        # （幅 W のポートでも O(セグメント数) のビット演算で済む）
+        lo_n = min(info.msb, info.lsb)
+        hi_n = max(info.msb, info.lsb)
+        mask_needed = ((1 << (hi_n - lo_n + 1)) - 1) << lo_n
+        mask_mapped = 0
         for hi, lo in indexed_segs:
-            for b in range(min(hi, lo), max(hi, lo) + 1):
-                bits_mapped.add(b)
+            l = min(hi, lo)
+            mask_mapped |= ((1 << (max(hi, lo) - l + 1)) - 1) << l
 
         # 単一セグメントの場合は従来通り「全ビットカバー」を要求し、
         # 複数セグメントで一部が未使用なケースは許容する。
-        if len(indexed_segs) == 1 and bits_mapped != bits_needed:
+        if len(indexed_segs) == 1 and mask_mapped != mask_needed:
             other_errors.append(
                 f"ポート {port_name} のビットが assign で全てカバーされていません。"
             )
-        elif bits_mapped - bits_needed:
+        elif mask_mapped & ~mask_needed:
             # assign 側で宣言幅を越えている（ありえないが保険）
             other_errors.append(
                 f"ポート {port_name} の assign が宣言範囲外のビットを参照しています。"
             )
 
     if problem_signals or other_errors:
+        # 細切れに write せず、1 回の書き込みにまとめる
+        msgs: List[str] = []
         if problem_signals:
-            sys.stderr.write(
+            msgs.append(
                 "Error: 安全に置き換えできない内部信号があります。"
                 "以下の信号について、ポート側の名前を手動で整えてから再実行してください:\n"
             )
-            for s in sorted(problem_signals):
-                sys.stderr.write(f"  - {s}\n")
+            msgs.extend(f"  - {s}\n" for s in sorted(problem_signals))
         if other_errors:
-            sys.stderr.write("詳細:\n")
-            for e in other_errors:
-                sys.stderr.write("  * " + e + "\n")
+            msgs.append("詳細:\n")
+            msgs.extend("  * " + e + "\n" for e in other_errors)
+        sys.stderr.write("".join(msgs))
         raise SystemExit(1)
 
-    return port_to_internal, internal_to_ports, port_segments
+    # 戻り値は従来通り 内部信号名 -> {ポート名,...} の形に組み立て直す
+    # （ここまで来たら conflict は無いので全て 1 要素の set）
+    internal_to_ports: Dict[str, Set[str]] = {
+        name: {port} for name, port in internal_owner.items()
+    }
+
+    return port_to_internal, internal_to_ports, port_segments, bridge_linenos
 
 
 def build_new_module_text(
@@ -319,10 +409,13 @@ def build_new_module_text(
     port_info: Dict[str, PortInfo],
     port_to_internal: Dict[str, str],
     style: str,
+    bridge_linenos: Optional[Set[int]] = None,
 ) -> str:
     """
     新しいポート名（内部信号名）に基づいて module テキストを組み立てる。
     style: 'ansi' or 'non-ansi'
+    bridge_linenos: analyse_assigns が返した橋渡し assign の行番号。
+    渡されていれば行毎の正規表現マッチを省略できる。
     """
     # 新しいポートリスト（順序は元の header に合わせる）
     new_ports: List[Tuple[str, PortInfo]] = []
@@ -342,31 +435,56 @@ def build_new_module_text(
     # body から元の input/output/inout 宣言と、ポート ↔ 内部信号の単純 assign を削除
     new_body_lines: List[str] = []
     ports_set = set(header_ports)
-    for line in body.splitlines():
-        stripped = line.lstrip()
-        if stripped.startswith(("input ", "output ", "inout ")):
+    # splitlines() で全行を一旦オブジェクト化せず、\n の位置を追いながら
+    # 残す行だけスライスする（削除される行は文字列を作らない）。
+    # 正規表現は pos/endpos 指定で body 上を直接マッチさせる
+    pos = 0
+    lineno = 0
+    body_len = len(body)
+    while pos < body_len:
+        nl = body.find('\n', pos)
+        end = body_len if nl < 0 else nl
+
+        keep = True
+        if DECL_HEAD_RE.match(body, pos, end):
             # 既存のポート宣言は全部削除して作り直す
-            continue
-
-        m = ASSIGN_LINE_RE.match(line)
-        if m:
-            lhs_raw, rhs_raw = m.group(1), m.group(2)
-            lhs = parse_signal_ref(lhs_raw)
-            rhs = parse_signal_ref(rhs_raw)
-            if lhs is not None and rhs is not None:
-                lhs_name, _, _ = lhs
-                rhs_name, _, _ = rhs
-                lhs_is_port = lhs_name in ports_set
-                rhs_is_port = rhs_name in ports_set
-                if lhs_is_port != rhs_is_port:
-                    # ポートと内部信号の単純な橋渡し assign なので削除
-                    continue
-
-        new_body_lines.append(line)
-
-    new_body = "\n".join(new_body_lines).rstrip() + "\n"
-
-    # 新しい module ヘッダとポート宣言を生成
+            keep = False
+        elif bridge_linenos is not None:
+            # 橋渡し行は analyse_assigns で判定済み。ASSIGN_LINE_RE は
+            # 「1 行完結の assign か」の確認だけに使い、候補行でのみ走らせる。
+            # （^ アンカー付きパターンは pos 指定ではマッチしないので行を切り出す）
+            if lineno in bridge_linenos and ASSIGN_LINE_RE.match(body[pos:end]):
+                keep = False
+        else:
+            m = ASSIGN_LINE_RE.match(body[pos:end])
+            if m:
+                lhs_raw, rhs_raw = m.group(1), m.group(2)
+                lhs = parse_signal_ref(lhs_raw)
+                rhs = parse_signal_ref(rhs_raw)
+                if lhs is not None and rhs is not None:
+                    lhs_name, _, _ = lhs
+                    rhs_name, _, _ = rhs
+                    lhs_is_port = lhs_name in ports_set
+                    rhs_is_port = rhs_name in ports_set
+                    if lhs_is_port != rhs_is_port:
+                        # ポートと内部信号の単純な橋渡し assign なので削除
+                        keep = False
+
+        if keep:
+            new_body_lines.append(body[pos:end])
+        pos = end + 1
+        lineno += 1
+
+    # 末尾の空行はリスト側で落とす（join 後の全文 rstrip でコピーし直さない）
+    while new_body_lines and not new_body_lines[-1].strip():
+        new_body_lines.pop()
+    if new_body_lines:
+        new_body_lines[-1] = new_body_lines[-1].rstrip()
+    new_body = "\n".join(new_body_lines) + "\n"
+
+    # 新しい module ヘッダとポート宣言を生成。
+    # 中間文字列を何段も連結せず、断片リストを 1 回の join で組み立てる
+    parts: List[str] = [pre]
     if style == "ansi":
         port_lines = []
         for name, info in new_ports:
@@ -374,12 +492,11 @@ def build_new_module_text(
             if info.msb is not None and info.lsb is not None:
                 rng = f" [{info.msb}:{info.lsb}]"
             port_lines.append(f"  {info.direction}{rng} {name}")
-        header = f"module {module_name} (\n" + ",\n".join(port_lines) + "\n);\n"
-        module_text = header + new_body + "endmodule\n"
+        parts.append(f"module {module_name} (\n" + ",\n".join(port_lines) + "\n);\n")
     else:  # non-ansi
         # ヘッダは名前のみ
         header_names = [f"  {name}" for name, _ in new_ports]
-        header = f"module {module_name} (\n" + ",\n".join(header_names) + "\n);\n"
+        parts.append(f"module {module_name} (\n" + ",\n".join(header_names) + "\n);\n")
         # ボディ先頭にポート宣言を追加
         decl_lines = []
         for name, info in new_ports:
@@ -387,10 +504,12 @@ def build_new_module_text(
             if info.msb is not None and info.lsb is not None:
                 rng = f" [{info.msb}:{info.lsb}]"
             decl_lines.append(f"  {info.direction}{rng} {name};")
-        decl_block = "\n".join(decl_lines) + "\n\n"
-        module_text = header + decl_block + new_body + "endmodule\n"
+        parts.append("\n".join(decl_lines) + "\n\n")
+    parts.append(new_body)
+    parts.append("endmodule\n")
+    parts.append(post)
 
-    return pre + module_text + post
+    return "".join(parts)
 
 
 def rewrite_instantiations(
@@ -402,31 +521,30 @@ def rewrite_instantiations(
     ファイル2中の module_name のインスタンスについて、named port 接続のポート名を
     port_to_internal に基づいて書き換える。
     """
+    # モジュール名が現れないファイルや空のマップでは正規表現を走らせるまでもない
+    if not port_to_internal or module_name not in text:
+        return text
+
     port_map = port_to_internal
 
-    inst_re = re.compile(
-        rf'(?P<full>'
-        rf'(?P<mod>{module_name})'
-        rf'\s*'
-        rf'(?P<params>#\s*\([^;]*?\)\s*)?'
-        rf'\s+'
-        rf'(?P<inst>\w+)'
-        rf'\s*\('
-        rf'(?P<ports>[^;]*?)'
-        rf'\);)',
-        re.S,
-    )
+    inst_re = _inst_re(module_name)
 
     def repl(m: re.Match) -> str:
         full = m.group("full")
         ports_str = m.group("ports")
 
-        def repl_port(pm: re.Match) -> str:
+        # .Port( 毎にコールバックを呼ぶ sub ではなく、マッチ位置で切って
+        # 断片を 1 回の join で繋ぐ
+        pieces = []
+        last = 0
+        for pm in PORT_CALL_RE.finditer(ports_str):
             pname = pm.group(1)
             new_name = port_map.get(pname, pname)
-            return f".{new_name}("
-
-        new_ports = re.sub(r'\.(\w+)\s*\(', repl_port, ports_str)
+            pieces.append(ports_str[last:pm.start()])
+            pieces.append(f".{new_name}(")
+            last = pm.end()
+        pieces.append(ports_str[last:])
+        new_ports = "".join(pieces)
 
         # full の中で ports 部分だけ差し替える
         start_ports = m.start("ports") - m.start("full")
@@ -439,6 +557,16 @@ def rewrite_instantiations(
     return new_text
 
 
+def _rewrite_inst_file(path: str, module_name: str, port_to_internal: Dict[str, str]) -> None:
+    """inst ファイル 1 つを読み、インスタンスを書き換えて上書きする。
+    ファイル毎に独立なので multiprocessing のワーカとしても使う。"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    new_text = rewrite_instantiations(text, module_name, port_to_internal)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(new_text)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Verilog モジュールの短いポート名を内部の長い信号名に置き換えるスクリプト"
@@ -450,7 +578,8 @@ def main():
     )
     parser.add_argument(
         "inst_file",
-        help="変換対象モジュールのインスタンスがある Verilog ファイル。",
+        nargs="+",
+        help="変換対象モジュールのインスタンスがある Verilog ファイル（複数可）。",
     )
     parser.add_argument(
         "--style",
@@ -458,6 +587,12 @@ def main():
         default="non-ansi",
         help="出力するポート宣言のスタイル（デフォルト: non-ansi）",
     )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="module_file の解析結果を <module_file>.vpr_cache に保存し、"
+        "同じ内容なら次回以降は解析をスキップする",
+    )
     args = parser.parse_args()
 
     # module_file の読み込み
@@ -473,16 +608,40 @@ def main():
         module_text = sys.stdin.read()
         module_path = None
 
-    # インスタンスファイル
-    with open(args.inst_file, "r", encoding="utf-8") as f:
-        inst_text = f.read()
-
-    # モジュール解析
-    module_name, header_ports, body, pre, post = parse_module(module_text)
-    port_info = parse_port_declarations(body, header_ports)
-    port_to_internal, internal_to_ports, port_segments = analyse_assigns(
-        body, header_ports, port_info
-    )
+    # モジュール解析。--cache 指定時は同一内容のファイルの再解析を
+    # sidecar ファイル経由でスキップする（同じモジュールを沢山の
+    # インスタンスファイルに対して繰り返し適用するバッチ運用向け）
+    cached = None
+    cache_path = key = None
+    if args.cache and module_path:
+        cache_path = module_path + ".vpr_cache"
+        key = hashlib.sha256(module_text.encode("utf-8")).digest()
+        try:
+            with open(cache_path, "rb") as f:
+                stored = pickle.load(f)
+            if stored.get("key") == key:
+                cached = stored["results"]
+        except (OSError, pickle.PickleError, EOFError, KeyError, AttributeError):
+            cached = None  # 壊れた/古い cache は無視して解析し直す
+
+    if cached is not None:
+        (module_name, header_ports, body, pre, post,
+         port_info, port_to_internal, bridge_linenos) = cached
+    else:
+        module_name, header_ports, body, pre, post = parse_module(module_text)
+        port_info = parse_port_declarations(body, header_ports)
+        port_to_internal, internal_to_ports, port_segments, bridge_linenos = analyse_assigns(
+            body, header_ports, port_info
+        )
+        if cache_path:
+            results = (module_name, header_ports, body, pre, post,
+                       port_info, port_to_internal, bridge_linenos)
+            try:
+                with open(cache_path, "wb") as f:
+                    pickle.dump({"key": key, "results": results}, f,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+            except OSError:
+                pass  # cache を書けなくても本処理は続行できる
 
     # 新しいモジュールのテキスト生成
     new_module_text = build_new_module_text(
@@ -494,23 +653,24 @@ def main():
         port_info,
         port_to_internal,
         style=args.style,
+        bridge_linenos=bridge_linenos,
     )
 
-    # インスタンスの書き換え
-    new_inst_text = rewrite_instantiations(inst_text, module_name, port_to_internal)
+    # インスタンスの書き換え（ファイル毎に独立なので、複数あればプロセス並列で処理）
+    jobs = [(path, module_name, port_to_internal) for path in args.inst_file]
+    if len(jobs) == 1:
+        # 1 ファイルならワーカ起動のオーバーヘッドの方が高い
+        _rewrite_inst_file(*jobs[0])
+    else:
+        with multiprocessing.Pool() as pool:
+            pool.starmap(_rewrite_inst_file, jobs)
 
     # 出力: module_file がある場合は上書き、無い場合は標準出力へ
     if module_path:
         with open(module_path, "w", encoding="utf-8") as f:
             f.write(new_module_text)
-        # インスタンスファイルも上書き
-        with open(args.inst_file, "w", encoding="utf-8") as f:
-            f.write(new_inst_text)
     else:
-        # module は標準出力、インスタンスはそのまま上書き
         sys.stdout.write(new_module_text)
-        with open(args.inst_file, "w", encoding="utf-8") as f:
-            f.write(new_inst_text)
 
 
 if __name__ == "__main__":